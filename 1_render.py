@@ -1,9 +1,15 @@
 from manim import *
+import json
 import numpy as np
 import os
+import scipy.sparse
 import shutil
 import time
 
+from connection import *
+from mesh import *
+from transport import *
+from wavefront import *
 from utils import *
 
 DEBUG = False
@@ -13,6 +19,12 @@ BACKGROUND_COLOR = WHITE
 config.background_color = BACKGROUND_COLOR
 config.max_files_cached = 1000
 
+SINGULARITY_VERTICES = {
+    (1, 1): 1,
+    (6, 3): -2,
+    (4, 4): -1,
+}
+
 def render_slides():
     start_time = time.time()
 
@@ -33,6 +45,7 @@ def render_slides():
     for filename in os.listdir(RENDER_DIRECTORY):
         nr = int(filename[9:-4])
         shutil.copyfile(f"{RENDER_DIRECTORY}/{filename}", f"{OUTPUT_DIRECTORY}/{nr:06}.png")
+    shutil.copyfile(RENDER_MANIFEST_FILENAME, OUTPUT_MANIFEST_FILENAME)
 
     duration = int(time.time() - start_time)
     print(f"\033[32;1mFinished in {duration // 60}m {duration % 60:02}s!\033[0m")
@@ -50,6 +63,8 @@ class MainScene(Scene):
     def pause(self):
         self.hold(0.15)
 
+        self.manifest.append({"page": self.page_number, "title": self.page_title})
+
         pause_marker_rectangle = Rectangle(PAUSE_MARKER_COLOR_HEX, 100, 100).set_fill(PAUSE_MARKER_COLOR_HEX, opacity=1)
         pause_marker_rectangle.z_index = 10 ** 10
         self.add_foreground_mobject(pause_marker_rectangle)
@@ -74,6 +89,7 @@ class MainScene(Scene):
     def next_slide(self):
         self.clear()
         self.update_page_number()
+        self.page_title = None
 
     def clear(self):
         self.remove(*self.all_objects())
@@ -87,6 +103,7 @@ class MainScene(Scene):
     def set_title(self, text, **kwargs):
         kwargs["color"] = kwargs.get("color", BLACK)
 
+        self.page_title = text
         self.title = Text(text, **kwargs).scale(0.8).to_corner(UP + LEFT).shift((0.2, -0.3, 0))
         self.add(self.title)
 
@@ -147,10 +164,15 @@ class MainScene(Scene):
         self.page_number = 0
 
         self.title = None
+        self.page_title = None
         self.page_number_text = None
+        self.manifest = []
 
         self.animate()
 
+        with open(RENDER_MANIFEST_FILENAME, "w") as f:
+            json.dump(self.manifest, f, indent=4)
+
     ################################
     #                              #
     #            SLIDES            #
@@ -411,7 +433,11 @@ class MainScene(Scene):
             run_time=0.6
         )
 
-        defect_angle = 0.3 * np.pi
+        # The holonomy around the apex of a low hexagonal pyramid, which the two paths below enclose.
+        cone, keys = grid_mesh([[*range(3)] for _ in range(3)])
+        apex = keys.index((1, 1))
+        cone.vertices[apex, 2] = 0.6
+        defect_angle = cycle_holonomies(cone, cycle_matrix(cone, [vertex_cycle(cone, apex)]))[0]
         pos_a = np.array([-2.5, -1.5, 0])
         pos_b = np.array([2.5, -1.5, 0])
         point_a = Triangle(color=BLACK)
@@ -985,14 +1011,17 @@ class MainScene(Scene):
         self.add(mesh_group)
         self.hold(0.5)
 
-        path_1 = [
-            f[frozenset({(0, 0), (0, 1), (1, 1)})],
-            f[frozenset({(0, 1), (1, 1), (1, 2)})],
-            f[frozenset({(1, 1), (1, 2), (2, 2)})],
-            f[frozenset({(1, 1), (2, 1), (2, 2)})],
-            f[frozenset({(1, 0), (1, 1), (2, 1)})],
-            f[frozenset({(0, 0), (1, 0), (1, 1)})],
-        ]
+        mesh, keys = grid_mesh([
+            [0, 1, 2],
+            [0, 1, 2, 3],
+            [1, 2, 3],
+        ])
+        face_keys = [frozenset(keys[j] for j in face) for face in mesh.faces]
+        path_1_edges, path_1_signs = vertex_cycle(mesh, keys.index((1, 1)))
+        path_2_edges, path_2_signs = vertex_cycle(mesh, keys.index((2, 1)))
+        shared_edge = mesh.find_edges(keys.index((1, 1)), keys.index((2, 1)))
+
+        path_1 = [f[face_keys[face]] for face in cycle_faces(mesh, path_1_edges, path_1_signs)]
         path_1_arrows = []
         for i in range(len(path_1)):
             pos_i, pos_j = path_1[i - 1].get_center(), path_1[i].get_center()
@@ -1000,14 +1029,7 @@ class MainScene(Scene):
             arrow = Arrow(max_tip_length_to_length_ratio=0.12).set_color(BLUE).put_start_and_end_on(pos_i, pos_j)
             path_1_arrows.append(arrow)
 
-        path_2 = [
-            f[frozenset({(1, 0), (1, 1), (2, 1)})],
-            f[frozenset({(1, 1), (2, 1), (2, 2)})],
-            f[frozenset({(2, 1), (2, 2), (3, 2)})],
-            f[frozenset({(2, 1), (3, 1), (3, 2)})],
-            f[frozenset({(2, 0), (2, 1), (3, 1)})],
-            f[frozenset({(1, 0), (2, 0), (2, 1)})],
-        ]
+        path_2 = [f[face_keys[face]] for face in cycle_faces(mesh, path_2_edges, path_2_signs)]
         path_2_arrows = []
         for i in range(len(path_2)):
             pos_i, pos_j = path_2[i - 1].get_center(), path_2[i].get_center()
@@ -1015,7 +1037,9 @@ class MainScene(Scene):
             arrow = Arrow(max_tip_length_to_length_ratio=0.12).set_color(GREEN).put_start_and_end_on(pos_i, pos_j)
             path_2_arrows.append(arrow)
 
-        left_arrow, right_arrow = path_1_arrows[4], path_2_arrows[1]
+        # Arrow i crosses the edge walked in step i, so the two arrows across the shared edge are pulled apart.
+        left_arrow = path_1_arrows[np.flatnonzero(path_1_edges == shared_edge)[0]]
+        right_arrow = path_2_arrows[np.flatnonzero(path_2_edges == shared_edge)[0]]
         right_arrow.shift(RIGHT * 0.1)
         left_arrow.shift(LEFT * 0.1)
         self.play(
@@ -1136,12 +1160,7 @@ class MainScene(Scene):
         mesh_group = Group(*f.values(), *e.values(), *v.values())
         mesh_group.move_to(ORIGIN)
 
-        singularity_vertices = {
-            (1, 1): 1,
-            (6, 3): -2,
-            (4, 4): -1,
-        }
-        for key, value in singularity_vertices.items():
+        for key, value in SINGULARITY_VERTICES.items():
             vertex = v[key]
             vertex.scale(3).set_fill_color(GREEN)
             k_text = Tex(f"${value}$", color=WHITE).scale(0.6).move_to(vertex)
@@ -1150,52 +1169,57 @@ class MainScene(Scene):
         self.add(mesh_group)
         self.pause()
 
+        mesh, keys = grid_mesh([[*range(10)] for _ in range(6)], spacing=2)
+        face_keys = [frozenset(keys[j] for j in face) for face in mesh.faces]
+
+        def dual_edge_points(edge, sign, vertex):
+            # Start and end of a dual edge walked in direction `sign`, pulled slightly towards `vertex`.
+            pos_v = v[keys[vertex]].get_center()
+            face_a, face_b = mesh.edge_faces[edge][::sign]
+            pos_fa, pos_fb = f[face_keys[face_a]].get_center(), f[face_keys[face_b]].get_center()
+            return pos_fa + 0.05 * (pos_v - pos_fa), pos_fb + 0.05 * (pos_v - pos_fb)
+
         def demonstrate_cycle(vertices, old_outer_arrows={}):
-            arrow_keys = []
-            for v_key in vertices:
-                x, y = v_key
-                boundary_vertex_keys = [
-                    (x - 1, y - 1),
-                    (x + 0, y - 1),
-                    (x + 1, y + 0),
-                    (x + 1, y + 1),
-                    (x + 0, y + 1),
-                    (x - 1, y + 0),
-                ]
-                face_keys = [frozenset([v_key, boundary_vertex_keys[j - 1], boundary_vertex_keys[j]]) for j in range(6)]
-                arrow_keys.extend([(v_key, face_keys[j - 1], face_keys[j]) for j in range(6)])
-
-            outer_arrows = {}
-            inner_arrows = set()
-            for arrow_key in arrow_keys:
-                pos_v, pos_fa, pos_fb = v[arrow_key[0]].get_center(), f[arrow_key[1]].get_center(), f[arrow_key[2]].get_center()
-                pos_fa = pos_fa + 0.05 * (pos_v - pos_fa)
-                pos_fb = pos_fb + 0.05 * (pos_v - pos_fb)
-                arrow = Arrow(max_tip_length_to_length_ratio=0.12).set_color(BLUE).put_start_and_end_on(pos_fa, pos_fb)
-
-                key = frozenset(arrow_key[1:])
-                if key in outer_arrows:
-                    inner_arrows.add(outer_arrows.pop(key))
-                    inner_arrows.add(arrow)
-                else:
-                    outer_arrows[key] = arrow
-            outer_arrows = set(outer_arrows.values())
+            region = np.array([keys.index(key) for key in vertices])
+            in_region = np.zeros(len(keys), bool)
+            in_region[region] = True
+            edges, signs, cancelled_edges = region_boundary(mesh, region)
+
+            outer_arrows = set()
+            for edge, sign in zip(edges, signs):
+                low, high = mesh.edges[edge]
+                start, end = dual_edge_points(edge, sign, low if in_region[low] else high)
+                outer_arrows.add(Arrow(max_tip_length_to_length_ratio=0.12).set_color(BLUE).put_start_and_end_on(start, end))
+
+            # Cancelled dual edges are walked once around each of their two vertices; all of them form one mobject.
+            inner_arrows = VMobject().set_stroke(BLUE, width=6).set_fill(BLUE, opacity=1)
+            for edge in cancelled_edges:
+                for vertex, sign in zip(mesh.edges[edge], [-1, 1]):
+                    start, end = dual_edge_points(edge, sign, vertex)
+                    direction = (end - start) / np.linalg.norm(end - start)
+                    normal = np.array([-direction[1], direction[0], 0])
+                    tip_base = end - 0.12 * direction
+                    inner_arrows.start_new_path(start)
+                    inner_arrows.add_line_to(tip_base)
+                    inner_arrows.start_new_path(end)
+                    inner_arrows.add_points_as_corners([tip_base + 0.06 * normal, tip_base - 0.06 * normal, end])
 
             self.play(
                 *[FadeOut(j) for j in old_outer_arrows],
-                *[self.create_arrow(j) for j in inner_arrows | outer_arrows],
+                *[self.create_arrow(j) for j in outer_arrows],
+                Create(inner_arrows),
                 run_time=0.4
             )
             self.hold(0.6)
 
             self.play(
-                *[j.animate.set_color(ORANGE) for j in inner_arrows],
+                inner_arrows.animate.set_color(ORANGE),
                 run_time=0.4
             )
             self.hold(0.6)
 
             self.play(
-                *[FadeOut(j) for j in inner_arrows],
+                FadeOut(inner_arrows),
                 run_time=0.4
             )
             self.hold(0.8)
@@ -1254,28 +1278,33 @@ class MainScene(Scene):
     def animate_slide_matrix_equation(self):
         self.next_slide()
 
+        # Rows of the actual cycle matrix of a small torus: its two generators, then vertex cycles.
+        mesh = torus_mesh(12, 8)
+        matrix = scipy.sparse.vstack([
+            cycle_matrix(mesh, tree_cotree(mesh)),
+            vertex_cycle_matrix(mesh),
+        ]).tocsr()
+
         linear_equations = []
         for iy in range(12):
-            linear_equation = []
-            random_indices = set()
-            while len(random_indices) < 6:
-                random_indices.add(np.random.randint(1, 100))
-            random_indices = [*random_indices]
-            for ix in range(17):
-                if ix == 13 or ix == 15:
+            row = matrix[iy]
+            terms = [*zip(row.indices, row.data)]
+            if len(terms) > 6:
+                terms = terms[:3] + [None] + terms[-3:]
+
+            texs = []
+            for ix, term in enumerate(terms):
+                if term is None:
+                    texs.extend(["$+$", "$\\ldots$"])
                     continue
+                edge_idx, sign = term
+                if ix > 0:
+                    texs.append("$+$" if sign > 0 else "$-$")
+                texs.append(f"${'-' * (ix == 0 and sign < 0)}x_{{e_{{{edge_idx + 1}}}}}$")
 
-                if ix == 6:
-                    tex = Tex("$\\ldots$")
-                elif ix == 14:
-                    tex = Tex("$=$")
-                elif ix == 16:
-                    tex = Tex(f"$-\\delta_{{{iy + 1}}}$")
-                elif ix % 2:
-                    tex = Tex("$+$" if np.random.random() < 0.6 else "$-$")
-                else:
-                    idx = random_indices.pop()
-                    tex = Tex(f"$x_{{e_{{{idx}}}}}$")
+            linear_equation = []
+            for ix, tex in [*enumerate(texs), (14, "$=$"), (16, f"$-\\delta_{{{iy + 1}}}$")]:
+                tex = Tex(tex)
                 tex.set_color(BLACK)
                 tex.scale(0.8).shift((-5.6 + 0.7 * ix, 3.5 - 0.73 * iy, 0))
                 self.add(tex)
@@ -1359,11 +1388,13 @@ class MainScene(Scene):
                 FadeIn(Group(*curr_new_edges), scale=10)
             )
 
-        def get_direction(pos):
-            x, y, _ = pos
-            dir = np.array([np.exp(0.15 * x), -0.4 * y + 1.5, 0])
-            dir *= 0.9 / np.linalg.norm(dir)
-            return dir
+        # The field of the trivial connection with the singularities of the cycle slides, grown from the start face.
+        mesh, keys = grid_mesh([[*range(10)] for _ in range(6)], spacing=2)
+        face_keys = [frozenset(keys[j] for j in face) for face in mesh.faces]
+        singularities = {keys.index(key): index for key, index in SINGULARITY_VERTICES.items()}
+        x = adjustment_angles(mesh, singularities)
+        field_angles, directions = construct_field(mesh, x, face_keys.index(start_face_key))
+        field = {face_key: 0.9 * direction for face_key, direction in zip(face_keys, directions)}
 
         def func(t):
             return 0.5 * linear(t) + 0.5 * smooth(t)
@@ -1371,7 +1402,7 @@ class MainScene(Scene):
         tangent_vectors = {}
         for f_key, face in f.items():
             pos = face.get_center()
-            dir = get_direction(pos)
+            dir = field[f_key]
 
             tangent_vector = Arrow(max_tip_length_to_length_ratio=0.12).set_color(RED).put_start_and_end_on(pos, pos + dir)
             tangent_vectors[f_key] = tangent_vector
@@ -1404,6 +1435,18 @@ class MainScene(Scene):
             [0, 0, 1, 2, 3, 4, 3, 2, 3, 2, 1, 6, 1, 2, 3, 2, 3],
             [0, 0, 0, 3, 2, 3, 2, 1, 2, 3, 2, 3, 2, 1, 0, 0, 0],
         ]
+        # Every code steps to the neighbouring face in direction (code - 1) * 60 degrees, 0 waits.
+        # All vectors are then carried along their face paths by the connection in one batch.
+        face_centers = np.array([f[face_key].get_center() for face_key in face_keys])
+        codes = np.array(paths)
+        offsets = np.where(codes[..., None] > 0, (2 / np.sqrt(3)) * np.stack([np.sin((codes - 1) * np.pi / 3), np.cos((codes - 1) * np.pi / 3), 0 * codes], axis=2), 0)
+        positions = f[start_face_key].get_center() + np.concatenate([np.zeros((len(paths), 1, 3)), np.cumsum(offsets, axis=1)], axis=1)
+        face_paths = np.linalg.norm(positions[:, :, None] - face_centers, axis=3).argmin(axis=2)
+
+        transport = ParallelTransport(mesh, x)
+        transported_angles = transport.transport(face_paths, field_angles[face_keys.index(start_face_key)])
+        transported_directions = 0.9 * transport.directions(face_paths, transported_angles)
+
         travelling_vectors = [tangent_vectors[start_face_key].copy().set_opacity(0.6) for _ in paths]
         for t in range(len(paths[0])):
             move_animations = []
@@ -1411,15 +1454,10 @@ class MainScene(Scene):
                 move_animations = [j.animate.set_stroke(LIGHT_GREY, opacity=1, width=3) for j in edge_circles]
 
             for i in range(len(paths)):
-                v = paths[i][t]
-                if v > 0:
-                    angle = (v - 1) * np.pi / 3
-                    vector = travelling_vectors[i]
-                    pos = vector.get_start()
-                    new_pos = pos + (2 / np.sqrt(3)) * np.array([np.sin(angle), np.cos(angle), 0])
-                    new_dir = get_direction(new_pos)
+                if paths[i][t] > 0:
+                    new_pos = face_centers[face_paths[i, t + 1]]
                     move_animations.append(
-                        vector.animate.put_start_and_end_on(new_pos, new_pos + new_dir)
+                        travelling_vectors[i].animate.put_start_and_end_on(new_pos, new_pos + transported_directions[i, t + 1])
                     )
 
             self.play(
@@ -1436,28 +1474,14 @@ class MainScene(Scene):
         )
         self.hold(0.4)
 
-        neighbors = {face_key: [] for face_key in f}
-        for face_key_i in f:
-            for face_key_j in f:
-                if len(face_key_i & face_key_j) == 2:
-                    neighbors[face_key_i].append(face_key_j)
-
-        q = [start_face_key]
-        seen = set(q)
-        while True:
-            come_from = {}
-            for face_key_i in q:
-                for face_key_j in neighbors[face_key_i]:
-                    if face_key_j not in seen and face_key_j not in come_from:
-                        come_from[face_key_j] = face_key_i
-
-            if not come_from:
-                break
-
+        # Replay the precomputed wavefronts: every face of a layer takes over the vector of its parent face.
+        i, j = mesh.edge_faces[mesh.interior_edges].T
+        layers, parents, _ = breadth_first_layers(len(mesh.faces), i, j, face_keys.index(start_face_key))
+        for layer in layers[1:]:
             animations = []
-            for face_key_j, face_key_i in come_from.items():
-                vector_i = tangent_vectors[face_key_i]
-                vector_j = tangent_vectors[face_key_j]
+            for face in layer:
+                vector_i = tangent_vectors[face_keys[parents[face]]]
+                vector_j = tangent_vectors[face_keys[face]]
 
                 vector_j.generate_target()
                 vector_j.put_start_and_end_on(*vector_i.get_start_and_end())
@@ -1469,10 +1493,6 @@ class MainScene(Scene):
                 run_time=0.2,
                 rate_func=func
             )
-
-            seen |= set(come_from.keys())
-            q = [*come_from.keys()]
-            np.random.shuffle(q)
         self.pause()
 
         tangent_vectors[start_face_key].z_index = 0
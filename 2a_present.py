@@ -1,50 +1,165 @@
+import argparse
 import cv2
 import screeninfo
+import sys
 import time
 
+from deck import *
+from playback import *
 from utils import *
 
 WINDOW_NAME = "Trivial Connections on Discrete Surfaces"
 FULLSCREEN = True
 MOUSE_CONTROLLED = True
 FRAMERATE = 60
+PREFETCH_AHEAD = 3
+PREFETCH_BEHIND = 1
+MEMORY_BUDGET = 2 * 1024 ** 3
+IDLE_INTERVAL = 0.02
+INTERPOLATION = "cubic"
+MEASURE_LATENCY = False
+LATENCY_LOG_FILENAME = f"{DIRECTORY}/latency.log"
 
-videos = read_output_videos()
+parser = argparse.ArgumentParser()
+parser.add_argument("--benchmark", nargs="?", const="", metavar="ACTIONS", help="run headless, replaying actions 0-3 (e.g. \"0 0 1 2 0\"; default: every slide forward, then back and skip)")
+parser.add_argument("--size", help="display size as WIDTHxHEIGHT (default: the monitor, or 1920x1080 when headless)")
+parser.add_argument("--resident", action="store_true", help="keep the decoded deck in shared memory for presenter relaunches")
+parser.add_argument("--slide", help="start at this slide number, or the first slide whose title contains it")
+args = parser.parse_args()
+HEADLESS = args.benchmark is not None
 
-print(f"\033[32;1mRunning!\033[0m")
+load_start_time = time.perf_counter()
 
-if FULLSCREEN:
+if args.size is not None:
+    display_size = tuple(int(c) for c in args.size.split("x"))
+elif HEADLESS:
+    display_size = (1920, 1080)
+else:
     screen = screeninfo.get_monitors()[0]
-    cv2.namedWindow(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN)
-    cv2.moveWindow(WINDOW_NAME, screen.x - 1, screen.y - 1)
-    cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    display_size = (screen.width, screen.height) if FULLSCREEN else (screen.width // 2, screen.height // 2)
+
+if args.resident:
+    serve_shared_deck(display_size, INTERPOLATION)
+    exit()
+
+deck = SharedDeck.attach(display_size, INTERPOLATION)
+if deck is not None:
+    print(f"\033[34;1mAttached to resident deck, resuming at video #{deck.current + 1}\033[0m")
 else:
+    deck = SlideDeck(PREFETCH_AHEAD, PREFETCH_BEHIND, MEMORY_BUDGET, display_size, INTERPOLATION)
+
+manifest = read_output_manifest()
+if args.slide is not None:
+    deck.wait_indexed()
+    start_video_nr = find_page(deck_pages(manifest, len(deck)), args.slide)
+    if start_video_nr is None:
+        print(f"\033[31;1mNo slide matches \"{args.slide}\"\033[0m")
+        exit()
+    deck.set_current(start_video_nr)
+
+frame = deck.wait(deck.current)[0]
+first_video_load_time = time.perf_counter() - load_start_time
+
+probe = LatencyProbe(MEASURE_LATENCY or HEADLESS)
+
+if HEADLESS:
+    deck.wait_indexed()
+    index_load_time = time.perf_counter() - load_start_time
+
+    if args.benchmark:
+        actions = [int(c) for c in args.benchmark.replace(",", " ").split()]
+    else:
+        actions = [0] * (len(deck) - 1) + [2] * min(5, len(deck) - 1) + [1] * min(5, len(deck) - 1)
+    sink = OffscreenSink(actions)
+    show_frame = sink.show
+    wait_key = sink.wait_key
+    transitions = []
+
+    print(f"\033[32;1mBenchmarking {len(actions)} actions...\033[0m")
+else:
+    print(f"\033[32;1mRunning!\033[0m")
+
     screen = screeninfo.get_monitors()[0]
-    cv2.namedWindow(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN)
-    cv2.moveWindow(WINDOW_NAME, screen.x - 1, screen.y - 1)
-    cv2.resizeWindow(WINDOW_NAME, screen.width // 2, screen.height // 2)
+    if FULLSCREEN:
+        cv2.namedWindow(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN)
+        cv2.moveWindow(WINDOW_NAME, screen.x - 1, screen.y - 1)
+        cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    else:
+        cv2.namedWindow(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN)
+        cv2.moveWindow(WINDOW_NAME, screen.x - 1, screen.y - 1)
+        cv2.resizeWindow(WINDOW_NAME, screen.width // 2, screen.height // 2)
+
+    show_frame = lambda frame: cv2.imshow(WINDOW_NAME, probe.overlay(frame))
+    wait_key = lambda delay, idle: cv2.waitKey(delay)
 
 action = -1
+jump_target = None
+overview = None
+typed_number = ""
 def click(event, x, y, flags, param):
-    global action
+    global action, jump_target
 
-    if event == cv2.EVENT_LBUTTONDOWN:
+    if event == cv2.EVENT_LBUTTONDOWN and overview is not None:
+        for x0, y0, x1, y1, video_nr in overview[1]:
+            if x0 <= x < x1 and y0 <= y < y1:
+                action = 4
+                jump_target = video_nr
+                probe.input()
+    elif event == cv2.EVENT_LBUTTONDOWN:
         action = 0
+        probe.input()
     elif event == cv2.EVENT_RBUTTONDOWN:
         action = 2
+        probe.input()
 
-if MOUSE_CONTROLLED:
+if MOUSE_CONTROLLED and not HEADLESS:
     cv2.setMouseCallback(WINDOW_NAME, click)
 
-video_nr = 0
-time_since_last_click = time.time()
+video_nr = deck.current
+time_since_last_click = time.time() if video_nr == 0 and args.slide is None else 0
+
+scheduler = FrameScheduler(FRAMERATE, IDLE_INTERVAL)
+scheduler.start(time_since_last_click)
+shown_frame = None
+
+def report_playback(video_nr):
+    if scheduler.late_frames or scheduler.dropped_frames:
+        print(f"\033[33;1mVideo #{video_nr + 1}: {scheduler.late_frames} late, {scheduler.dropped_frames} dropped of {scheduler.frame_count} frames\033[0m")
 
 while True:
-    frame_nr = max(0, min(int((time.time() - time_since_last_click) * FRAMERATE), len(videos[video_nr]) - 1))
-    cv2.imshow(WINDOW_NAME, videos[video_nr][frame_nr])
-    key = cv2.waitKey(1)
+    frames = deck.get(video_nr)
+    if frames is not None:
+        frame = frames[scheduler.select(len(frames), time.time())]
+        probe.selected()
+        delay = scheduler.delay(time.time())
+    else:
+        if time_since_last_click:
+            time_since_last_click = time.time()
+            scheduler.start(time_since_last_click)
+        delay = 1 / FRAMERATE
+
+    shown = frame if overview is None else overview[0]
+    if shown is not shown_frame:
+        show_frame(shown)
+        shown_frame = shown
+        probe.shown()
+    key = wait_key(max(1, round(1000 * delay)), frames is not None and scheduler.last_frame_nr == len(frames) - 1)
 
-    if key in [32, 13]:
+    if key in range(48, 58):
+        typed_number += chr(key)
+        print(f"\033[30;1mGo to slide {typed_number}...\033[0m")
+    elif key in [8] and typed_number:
+        typed_number = typed_number[:-1]
+        print(f"\033[30;1mGo to slide {typed_number}...\033[0m")
+    elif key in [13] and typed_number:
+        jump_target = find_page(deck_pages(manifest, len(deck)), typed_number)
+        action = 4
+        typed_number = ""
+    elif key in [111]:
+        overview = build_overview(deck, deck_pages(manifest, len(deck)), display_size) if overview is None else None
+    elif key in [27] and overview is not None:
+        overview = None
+    elif key in [32, 13]:
         action = 0
     elif key in [100]:
         action = 1
@@ -53,13 +168,16 @@ while True:
     elif key in [27]:
         action = 3
 
+    previous_video_nr, handled_action = video_nr, action
+    if action != -1:
+        probe.input()
     if action == 0:
-        if video_nr < len(videos) - 1:
+        if video_nr < len(deck) - 1:
             video_nr += 1
             time_since_last_click = time.time()
         action = -1
     elif action == 1:
-        if video_nr < len(videos) - 1:
+        if video_nr < len(deck) - 1:
             video_nr += 1
             time_since_last_click = 0
         action = -1
@@ -69,6 +187,42 @@ while True:
             time_since_last_click = 0
         action = -1
     elif action == 3:
+        report_playback(video_nr)
         break
+    elif action == 4:
+        if jump_target is not None and jump_target != video_nr:
+            video_nr = jump_target
+            time_since_last_click = 0
+        overview = None
+        jump_target = None
+        action = -1
+
+    if video_nr != previous_video_nr:
+        report_playback(previous_video_nr)
+        scheduler.start(time_since_last_click)
+        deck.set_current(video_nr)
+        if HEADLESS:
+            transitions.append((handled_action, previous_video_nr, video_nr))
+    elif handled_action != -1:
+        probe.cancel()
+
+print(f"\033[30;1m{scheduler.total_late_frames} late, {scheduler.total_dropped_frames} dropped frames in total\033[0m")
+probe.write_histogram(LATENCY_LOG_FILENAME)
 
-cv2.destroyAllWindows()
+if HEADLESS:
+    for (handled_action, from_nr, to_nr), (_, latency) in zip(transitions, probe.latencies):
+        print(f"\033[30;1mAction {handled_action}: video #{from_nr + 1} -> #{to_nr + 1} in {1000 * latency:.2f} ms\033[0m")
+
+    latencies = 1000 * np.array([latency for _, latency in probe.latencies] or [0])
+    print(f"\033[34;1mLoad time:  {first_video_load_time:.2f} s until the first video, {index_load_time:.2f} s until indexed\033[0m")
+    # `resource` only exists on POSIX systems; ru_maxrss is in kB on Linux, but in bytes on macOS.
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+        print(f"\033[34;1mPeak RSS:   {peak_rss:.0f} MB\033[0m")
+    except ImportError:
+        print(f"\033[34;1mPeak RSS:   n/a\033[0m")
+    print(f"\033[34;1mTransition: p50 {np.percentile(latencies, 50):.2f} ms, p95 {np.percentile(latencies, 95):.2f} ms, max {latencies.max():.2f} ms\033[0m")
+    print(f"\033[34;1mPlayback:   {sink.animated_frames / max(sink.animated_time, 1e-9):.1f} frames/s sustained over {sink.animated_time:.2f} s\033[0m")
+else:
+    cv2.destroyAllWindows()
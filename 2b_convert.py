@@ -1,43 +1,147 @@
-import cv2
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
 import os
-from PIL import Image
 from pptx import Presentation
+from pptx.media import Video
+from pptx.opc.constants import CONTENT_TYPE
+from pptx.oxml.ns import qn
 from pptx.util import Inches
 
+from encode import *
+from pdf import *
 from utils import *
 
-THUMBNAIL_FILENAME = f"{DIRECTORY}/thumbnail.png"
-VIDEO_FILENAME = f"{DIRECTORY}/video.mov"
+PDF_IMAGE_FORMAT = "jpeg"
+PDF_QUALITY = 90
+PDF_FLATE_LEVEL = 6
 
-videos = read_output_videos()
-height, width, _ = videos[0][0].shape
+CODECS = ["h264", "mp4v"]
+PRESET = "medium"
+QUALITY = 23
+BITRATE = None
 
-prs = Presentation()
-prs.slide_width = Inches(16)
-prs.slide_height = Inches(9)
+PPTX_FILENAME = f"{DIRECTORY}/output.pptx"
+CLIP_SHAPE_PREFIX = "clip "
 
-pages = [Image.fromarray(cv2.cvtColor(frames[-1], cv2.COLOR_BGR2RGB)) for frames in videos]
-pages[0].save(f"{DIRECTORY}/output.pdf", "PDF", resolution=100.0, save_all=True, append_images=pages[1:])
+def add_media(prs, slide, key, clip):
+    # Adds the clip as a full-slide picture or movie, named after its key so an update can find it again.
+    video_filename, image_filename, _, _ = clip
+    if video_filename is None:
+        shape = slide.shapes.add_picture(image_filename, 0, 0, prs.slide_width, prs.slide_height)
+    else:
+        shape = slide.shapes.add_movie(video_filename, 0, 0, prs.slide_width, prs.slide_height, poster_frame_image=image_filename)
+        tree = shape._element.getparent().getparent().getnext().getnext()
+        timing = [el for el in tree.iterdescendants() if etree.QName(el).localname == "cond"][0]
+        timing.set("delay", "0")
+    shape.name = f"{CLIP_SHAPE_PREFIX}{key}"
 
-for idx, frames in enumerate(videos):
-    cv2.imwrite(THUMBNAIL_FILENAME, frames[0])
-    video_writer = cv2.VideoWriter(VIDEO_FILENAME, cv2.VideoWriter_fourcc(*"mp4v"), FRAMERATE, (width, height))
-    for frame in frames:
-        video_writer.write(frame)
-    video_writer.release()
+def find_media(slide):
+    # Returns (shape, key, is movie) of the clip on a slide written by `add_media`, or None.
+    for shape in slide.shapes:
+        if shape.name.startswith(CLIP_SHAPE_PREFIX):
+            is_movie = bool(shape._element.xpath(".//a:videoFile"))
+            return shape, shape.name[len(CLIP_SHAPE_PREFIX):], is_movie
+    return None
 
-    slide_layout = prs.slide_layouts[1]
-    slide = prs.slides.add_slide(slide_layout)
-    movie = slide.shapes.add_movie(VIDEO_FILENAME, 0, 0, prs.slide_width, prs.slide_height, poster_frame_image=THUMBNAIL_FILENAME)
-    tree = movie._element.getparent().getparent().getnext().getnext()
-    timing = [el for el in tree.iterdescendants() if etree.QName(el).localname == "cond"][0]
-    timing.set("delay", "0")
+def replace_media(slide, shape, key, clip):
+    # Points the shape at new media and poster parts in place, so its id and the slide timing are kept.
+    video_filename, image_filename, _, _ = clip
+    element = shape._element
+    old_rIds = set(element.xpath(".//@r:embed | .//@r:link"))
 
-    print(f"\033[30;1mProcessed video #{idx + 1}\033[0m")
+    _, image_rId = slide.part.get_or_add_image_part(image_filename)
+    element.xpath(".//a:blip")[0].set(qn("r:embed"), image_rId)
+    if video_filename is not None:
+        media_rId, video_rId = slide.part.get_or_add_video_media_part(Video.from_path_or_file_like(video_filename, CONTENT_TYPE.VIDEO))
+        element.xpath(".//a:videoFile")[0].set(qn("r:link"), video_rId)
+        [el for el in element.iter() if etree.QName(el).localname == "media"][0].set(qn("r:embed"), media_rId)
 
-prs.save(f"{DIRECTORY}/output.pptx")
-os.unlink(VIDEO_FILENAME)
-os.unlink(THUMBNAIL_FILENAME)
+    # Parts no longer related to any slide are left out when the package is saved.
+    for rId in old_rIds - set(slide.part._element.xpath("//@r:embed | //@r:link")):
+        slide.part.drop_rel(rId)
+    shape.name = f"{CLIP_SHAPE_PREFIX}{key}"
 
-print(f"\033[32;1mDone!\033[0m")
+def open_for_update(keys, clips):
+    # Reopens the previous export if it has the same slides, each holding the same kind of clip.
+    if not os.path.exists(PPTX_FILENAME):
+        return None
+
+    prs = Presentation(PPTX_FILENAME)
+    if len(prs.slides) != len(keys):
+        return None
+    for slide, key in zip(prs.slides, keys):
+        media = find_media(slide)
+        if media is None or media[2] != (clips[key][0] is not None):
+            return None
+    return prs
+
+def convert(update=False):
+    video_filenames = read_output_video_filenames()
+    settings = encoder_settings(CODECS, PRESET, QUALITY, BITRATE)
+    print(f"\033[34;1mEncoding with {settings[0]}\033[0m")
+
+    with ProcessPoolExecutor(os.cpu_count()) as pool:
+        pdf_writer = PdfWriter(f"{DIRECTORY}/output.pdf", resolution=100.0)
+        quality = PDF_FLATE_LEVEL if PDF_IMAGE_FORMAT == "flate" else PDF_QUALITY
+        tasks = [(frame_filenames[-1], PDF_IMAGE_FORMAT, quality) for frame_filenames in video_filenames]
+        for start in range(0, len(tasks), 2 * os.cpu_count()):
+            for page in pool.map(compress_page, tasks[start:start + 2 * os.cpu_count()]):
+                pdf_writer.add_page(*page)
+        pdf_writer.close()
+
+        # Identical slides (e.g. the intro and outro) share one clip, which python-pptx then
+        # stores once in the package, since it looks media parts up by their SHA-1.
+        keys = [*pool.map(video_key, video_filenames, [settings] * len(video_filenames))]
+        unique_videos = {}
+        for key, frame_filenames in zip(keys, video_filenames):
+            unique_videos.setdefault(key, frame_filenames)
+        clips = dict(zip(unique_videos, pool.map(encode_video, [(key, frame_filenames, settings) for key, frame_filenames in unique_videos.items()])))
+        print(f"\033[34;1mEncoded {len(unique_videos)} unique clips for {len(keys)} slides\033[0m")
+
+        prs = open_for_update(keys, clips) if update else None
+        if update and prs is None:
+            print(f"\033[33;1mSlides were added, removed or changed kind, rebuilding the whole presentation\033[0m")
+        updating = prs is not None
+        if not updating:
+            prs = Presentation()
+            prs.slide_width = Inches(16)
+            prs.slide_height = Inches(9)
+
+        total_size = 0
+        updated = 0
+        for idx, key in enumerate(keys):
+            video_filename, image_filename, cached, duration = clips[key]
+            if not updating:
+                slide = prs.slides.add_slide(prs.slide_layouts[1])
+                add_media(prs, slide, key, clips[key])
+            else:
+                slide = prs.slides[idx]
+                shape, old_key, _ = find_media(slide)
+                if old_key == key:
+                    continue
+                replace_media(slide, shape, key, clips[key])
+                updated += 1
+
+            size = os.path.getsize(video_filename or image_filename)
+            if keys.index(key) != idx:
+                report = f"same as #{keys.index(key) + 1}"
+            else:
+                report = f"{'cached' if cached else f'{duration:.2f} s'}, {size / 1024:.0f} kB"
+                total_size += size
+            print(f"\033[30;1mProcessed {'video' if video_filename else 'still'} #{idx + 1} ({report})\033[0m")
+
+        if updating:
+            print(f"\033[34;1mUpdated {updated} of {len(keys)} slides\033[0m")
+        print(f"\033[34;1mMedia: {total_size / 1024 ** 2:.1f} MB\033[0m")
+
+    prs.save(PPTX_FILENAME)
+
+    print(f"\033[32;1mDone!\033[0m")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="only replace the media of changed slides in the existing output.pptx")
+    args = parser.parse_args()
+
+    convert(args.update)
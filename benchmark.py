@@ -0,0 +1,68 @@
+import time
+
+from connection import *
+from cycles import *
+from mesh import *
+from weights import *
+
+SIZES = [50, 100, 200, 400]
+GENERA = [1, 4, 16]
+
+def genus_mesh(size, genus):
+    # Closed genus g mesh: a size x size grid with g holes, as a plate of thickness 1.
+    top, keys = grid_mesh([[*range(size)] for _ in range(size)])
+    keys = np.array(keys)
+
+    columns = int(np.ceil(np.sqrt(genus)))
+    hole_size = (size - 2) // (2 * columns + 1)
+    holes = [(2 * (idx % columns) + 1, 2 * (idx // columns) + 1) for idx in range(genus)]
+    face_keys = keys[top.faces].mean(axis=1)
+    keep = np.ones(len(top.faces), bool)
+    for hx, hy in holes:
+        inside = (face_keys >= (np.array([hx, hy]) * hole_size + 1)) & (face_keys <= (np.array([hx, hy]) + 1) * hole_size)
+        keep &= ~inside.all(axis=1)
+
+    used, faces = np.unique(top.faces[keep], return_inverse=True)
+    top = TriangleMesh(top.vertices[used], faces.reshape(-1, 3))
+
+    # The copy sits below the plane and is joined to the original by a strip of triangles along every boundary.
+    count = len(top.vertices)
+    boundary = (top.edge_faces < 0).any(axis=1)
+    forward = top.edge_faces[boundary, 0] >= 0
+    u = np.where(forward, top.edges[boundary, 0], top.edges[boundary, 1])
+    v = np.where(forward, top.edges[boundary, 1], top.edges[boundary, 0])
+    strip = np.concatenate([np.stack([v, u, u + count], axis=1), np.stack([v, u + count, v + count], axis=1)])
+
+    vertices = np.concatenate([top.vertices, top.vertices - [0, 0, 1]])
+    faces = np.concatenate([top.faces, top.faces[:, ::-1] + count, strip])
+    return TriangleMesh(vertices, faces)
+
+def benchmark():
+    for genus in GENERA:
+        for size in SIZES:
+            mesh = genus_mesh(size, genus)
+
+            start_time = time.perf_counter()
+            generators = tree_cotree(mesh)
+            cotree_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            adjustment_angles(mesh, {0: mesh.euler_characteristic}, generators, cache=False)
+            solve_time = time.perf_counter() - start_time
+
+            # The weights are part of the weighted time, as they would be computed for every new mesh.
+            start_time = time.perf_counter()
+            adjustment_angles(mesh, {0: mesh.euler_characteristic}, generators, cotan_weights(mesh), cache=False)
+            weighted_solve_time = time.perf_counter() - start_time
+
+            # A second solve with other singularities reuses the factorization of the first (or the solution of an earlier run).
+            adjustment_angles(mesh, {0: mesh.euler_characteristic}, generators)
+            start_time = time.perf_counter()
+            adjustment_angles(mesh, {0: mesh.euler_characteristic - 1, 1: 1}, generators)
+            resolve_time = time.perf_counter() - start_time
+
+            status = "\033[30;1m" if len(generators) == 2 * mesh.genus else "\033[31;1m"
+            print(f"{status}genus {mesh.genus:>2}, {len(mesh.faces):>7} faces: {len(generators):>2} generators in {1000 * cotree_time:7.1f} ms, solved in {1000 * solve_time:7.1f} ms ({1000 * weighted_solve_time:7.1f} ms weighted), re-solved in {1000 * resolve_time:7.1f} ms\033[0m")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,101 @@
+import hashlib
+import numpy as np
+import os
+import scipy.sparse
+import scipy.sparse.linalg
+
+from holonomy import *
+from utils import *
+from wavefront import *
+
+try:
+    from sksparse.cholmod import cholesky
+except ImportError:
+    cholesky = None
+
+def factorize(matrix):
+    # Returns a function solving `matrix @ y = b` for a symmetric positive definite sparse matrix.
+    # CHOLMOD is used when scikit-sparse is installed, a SuperLU factorization otherwise.
+    matrix = scipy.sparse.csc_matrix(matrix)
+    if cholesky is not None:
+        return cholesky(matrix)
+    return scipy.sparse.linalg.splu(matrix, permc_spec="MMD_AT_PLUS_A").solve
+
+SOLUTION_CACHE_DIRECTORY = f"{DIRECTORY}/media/connections"
+
+# Factorizations of A D^-2 A^T for the current session, by system key.
+FACTORIZATIONS = {}
+
+def array_key(*arrays):
+    sha = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        sha.update(f"{array.dtype} {array.shape}".encode())
+        sha.update(array.tobytes())
+    return sha.hexdigest()
+
+def minimum_norm_solution(A, b, weights=None, cache=True):
+    # x = D^-2 A^T (A D^-2 A^T)^-1 b, the solution of A x = b of least norm ||D x|| (D = I without weights).
+    # The factorization only depends on A and D, that is on the mesh connectivity, the generators and the geometry
+    # through the weights, so it is kept for the session and a new b (other singularities) is only a back-substitution.
+    # Solutions are cached on disk by system and b, which also covers the geometry through the defects.
+    # Without `cache`, everything is computed from scratch and nothing is kept.
+    A = scipy.sparse.csr_matrix(A)
+    system_key = array_key(A.indptr, A.indices, A.data, weights if weights is not None else [])
+    solution_filename = f"{SOLUTION_CACHE_DIRECTORY}/{array_key(system_key, b)}.npy"
+    if cache and os.path.exists(solution_filename):
+        return np.load(solution_filename)
+
+    if weights is not None:
+        A_weighted = A @ scipy.sparse.diags(weights ** -2.0)
+    else:
+        A_weighted = A
+    if not cache:
+        return A_weighted.T @ factorize(A_weighted @ A.T)(b)
+    if system_key not in FACTORIZATIONS:
+        FACTORIZATIONS[system_key] = factorize(A_weighted @ A.T)
+    x = A_weighted.T @ FACTORIZATIONS[system_key](b)
+
+    os.makedirs(SOLUTION_CACHE_DIRECTORY, exist_ok=True)
+    with open(f"{solution_filename}.partial", "wb") as f:
+        np.save(f, x)
+    os.replace(f"{solution_filename}.partial", solution_filename)
+    return x
+
+def adjustment_angles(mesh, singularities={}, generators=[], weights=None, cache=True):
+    # Minimum-norm adjustment angles x with A x = b (Crane et al. 2010, "Trivial Connections on Discrete Surfaces"),
+    # where every vertex cycle must end up with holonomy 2 pi k_v - delta_v. `singularities` maps vertex -> index k_v.
+    # On surfaces with handles, the dual cycles in `generators` (see `tree_cotree`) must end up with no holonomy.
+    # Given `weights` (the diagonal of D, see `cotan_weights`), ||D x|| is minimized instead of ||x||.
+    A, defects = basis_cycles(mesh, generators)
+
+    k = np.zeros(len(mesh.vertices))
+    for vertex, index in singularities.items():
+        k[vertex] = index
+    if not mesh.boundary_vertices.any() and round(k.sum()) != mesh.euler_characteristic:
+        raise ValueError(f"Singularity indices sum to {round(k.sum())}, but must sum to the Euler characteristic {mesh.euler_characteristic}")
+
+    # Generators carry no singularity, so their target holonomy is 0.
+    k = np.concatenate([k[mesh.interior_vertices][:A.shape[0] - len(generators)], np.zeros(len(generators))])
+    b = 2 * np.pi * k - defects
+
+    return minimum_norm_solution(A, b, weights, cache)
+
+def construct_field(mesh, x, start_face=0, start_angle=0):
+    # Propagates a unit vector from `start_face` along a breadth-first spanning tree of the dual graph,
+    # rotating by rho_e + x_e across every dual edge. Returns the angle per face (in its frame) and world directions.
+    i, j = mesh.edge_faces[mesh.interior_edges].T
+    _, parents, parent_edges = breadth_first_layers(len(mesh.faces), i, j, start_face)
+    children = np.flatnonzero(parents >= 0)
+    edges = mesh.interior_edges[parent_edges[children]]
+    signs = np.where(mesh.edge_faces[edges, 0] == parents[children], 1, -1)
+
+    # The angle of a face is the sum of all rotations on the way down from the start face.
+    steps = np.zeros(len(mesh.faces))
+    steps[start_face] = start_angle
+    steps[children] = signs * (mesh.transport_angles() + x)[edges]
+    angles = tree_sums(parents, steps)
+
+    first, second, _ = mesh.face_frames()
+    directions = np.cos(angles)[:, None] * first + np.sin(angles)[:, None] * second
+    return angles, directions
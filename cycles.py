@@ -0,0 +1,127 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from mesh import *
+
+# Dual cycles are kept as (edges, signs): the dual edges in walking order, +1 where the walk follows
+# the dual edge orientation (edge_faces[:, 0] -> edge_faces[:, 1]) and -1 where it goes against it.
+
+def cycle_faces(mesh, edges, signs):
+    # The face reached after every step of a dual cycle.
+    return mesh.edge_faces[edges, np.where(signs > 0, 1, 0)]
+
+def vertex_cycle(mesh, vertex):
+    # The dual cycle counter-clockwise around an interior vertex.
+    edges = np.flatnonzero((mesh.edges == vertex).any(axis=1))
+    signs = np.where(mesh.edges[edges, 1] == vertex, 1, -1)
+    starts = mesh.edge_faces[edges, np.where(signs > 0, 0, 1)]
+    step_from = {face: idx for idx, face in enumerate(starts)}
+
+    order = [0]
+    for _ in range(len(edges) - 1):
+        order.append(step_from[cycle_faces(mesh, edges[order[-1:]], signs[order[-1:]])[0]])
+    return edges[order], signs[order]
+
+def vertex_cycle_matrix(mesh):
+    # One row per interior vertex: the dual cycle around it, counter-clockwise, as signed dual edges.
+    # Going counter-clockwise around v crosses the dual edge of (v, w) along its orientation iff v is the high end.
+    low, high = mesh.edges.T
+    rows = np.concatenate([low, high])
+    columns = np.concatenate([np.arange(len(mesh.edges))] * 2)
+    values = np.concatenate([-np.ones(len(mesh.edges)), np.ones(len(mesh.edges))])
+
+    row_of_vertex = np.full(len(mesh.vertices), -1)
+    row_of_vertex[mesh.interior_vertices] = np.arange(len(mesh.interior_vertices))
+    keep = row_of_vertex[rows] >= 0
+
+    shape = (len(mesh.interior_vertices), len(mesh.edges))
+    return scipy.sparse.csr_matrix((values[keep], (row_of_vertex[rows[keep]], columns[keep])), shape)
+
+def region_boundary(mesh, vertices):
+    # The boundary operator on regions of interior vertices: summing their counter-clockwise cycles (r @ A)
+    # cancels every dual edge between two region vertices and leaves the oriented boundary chain.
+    # Returns the surviving dual edges with their signs (unordered) and the dual edges that cancelled.
+    vertices = np.asarray(vertices)
+    rows = np.searchsorted(mesh.interior_vertices, vertices)
+    if (rows >= len(mesh.interior_vertices)).any() or (mesh.interior_vertices[np.minimum(rows, len(mesh.interior_vertices) - 1)] != vertices).any():
+        raise ValueError("Regions may only contain interior vertices")
+
+    A = vertex_cycle_matrix(mesh)
+    region = np.zeros(A.shape[0])
+    region[rows] = 1
+    chain = A.T @ region
+    touched = abs(A).T @ region
+
+    edges = np.flatnonzero(chain)
+    return edges, chain[edges].astype(np.int64), np.flatnonzero((touched > 0) & (chain == 0))
+
+def cycle_matrix(mesh, cycles):
+    # One row per dual cycle, with the signs of its dual edges.
+    rows = np.concatenate([np.full(len(edges), idx) for idx, (edges, _) in enumerate(cycles)] + [np.zeros(0, np.int64)])
+    columns = np.concatenate([edges for edges, _ in cycles] + [np.zeros(0, np.int64)])
+    values = np.concatenate([signs for _, signs in cycles] + [np.zeros(0)]).astype(np.float64)
+    return scipy.sparse.csr_matrix((values, (rows, columns)), (len(cycles), len(mesh.edges)))
+
+def spanning_tree(node_count, a, b, root):
+    # Breadth-first spanning tree of the undirected graph with edges (a[i], b[i]).
+    # Returns the visiting order, the parent of every node and the index i of the edge to the parent (-1 at the root).
+    graph = scipy.sparse.csr_matrix((np.ones(len(a)), (a, b)), (node_count, node_count))
+    order, parents = scipy.sparse.csgraph.breadth_first_order(graph, root, directed=False)
+
+    parent_edges = np.full(node_count, -1)
+    children = order[1:]
+    forward = find_pairs(children, parents[children], a, b, node_count)
+    backward = find_pairs(parents[children], children, a, b, node_count)
+    found_forward = (a[forward] == children) & (b[forward] == parents[children])
+    parent_edges[children] = np.where(found_forward, forward, backward)
+    return order, parents, parent_edges
+
+def tree_sums(parents, values):
+    # Sum of `values` over every node and all of its ancestors (parent -1 at the root), by pointer jumping:
+    # each round doubles how far every node has summed, so a tree of depth d takes log2(d) vectorized rounds.
+    sums = np.array(values)
+    jumps = np.array(parents)
+    active = np.flatnonzero(jumps >= 0)
+    while len(active):
+        sums[active] += sums[jumps[active]]
+        jumps[active] = jumps[jumps[active]]
+        active = active[jumps[active] >= 0]
+    return sums
+
+def tree_cotree(mesh, root_vertex=0, root_face=0):
+    # Generators of the first homology of a closed mesh (Eppstein 2003, "Dynamic generators of topologically
+    # embedded graphs"): a spanning tree T of the vertices, a spanning tree C of the faces over the dual edges
+    # not crossing T, and one dual cycle through C for each of the 2g edges in neither. Linear in V + E.
+    edge_count = len(mesh.edges)
+    _, _, tree_edges = spanning_tree(len(mesh.vertices), mesh.edges[:, 0], mesh.edges[:, 1], root_vertex)
+    in_tree = np.zeros(edge_count, bool)
+    in_tree[tree_edges[tree_edges >= 0]] = True
+
+    dual_edges = mesh.interior_edges[~in_tree[mesh.interior_edges]]
+    i, j = mesh.edge_faces[dual_edges].T
+    _, face_parents, cotree_edges = spanning_tree(len(mesh.faces), i, j, root_face)
+    face_parent_edges = np.where(cotree_edges >= 0, dual_edges[cotree_edges], -1)
+    in_cotree = np.zeros(edge_count, bool)
+    in_cotree[face_parent_edges[face_parent_edges >= 0]] = True
+
+    face_parents = np.where(face_parents >= 0, face_parents, -1)
+    depths = tree_sums(face_parents, (face_parents >= 0).astype(np.int64))
+
+    generators = []
+    for edge in dual_edges[~in_cotree[dual_edges]]:
+        # Cross the edge, climb from the far face to the lowest common ancestor, then descend back.
+        start, end = mesh.edge_faces[edge]
+        up_start, up_end = [start], [end]
+        while up_start[-1] != up_end[-1]:
+            if depths[up_start[-1]] >= depths[up_end[-1]]:
+                up_start.append(face_parents[up_start[-1]])
+            else:
+                up_end.append(face_parents[up_end[-1]])
+
+        walk = np.array([start, *up_end, *up_start[-2::-1]])
+        edges = np.array([edge, *face_parent_edges[up_end[:-1]], *face_parent_edges[up_start[-2::-1]]], np.int64)
+        signs = np.where(mesh.edge_faces[edges, 0] == walk[:-1], 1, -1)
+        generators.append((edges, signs))
+
+    return generators
@@ -0,0 +1,354 @@
+import cv2
+import hashlib
+import numpy as np
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from utils import *
+
+INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "area": cv2.INTER_AREA,
+    "lanczos": cv2.INTER_LANCZOS4,
+}
+
+def fit_frame_size(frame_shape, display_size):
+    height, width = frame_shape[:2]
+    scale = min(display_size[0] / width, display_size[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def prepare_frame(frame, display_size, interpolation):
+    if display_size is None:
+        return frame
+
+    size = fit_frame_size(frame.shape, display_size)
+    if size == (frame.shape[1], frame.shape[0]):
+        return frame
+    return cv2.resize(frame, size, interpolation=interpolation)
+
+class SlideDeck:
+    # Keeps a window of decoded videos around the current one, within a memory budget.
+    # Indexing and decoding happen on background threads, so `get` never blocks on disk.
+    # With a display size, frames are scaled once on load so showing them is a plain blit.
+
+    def __init__(self, ahead=3, behind=1, memory_budget=2 * 1024 ** 3, display_size=None, interpolation="cubic"):
+        self.ahead = ahead
+        self.behind = behind
+        self.memory_budget = memory_budget
+        self.display_size = display_size
+        self.interpolation = INTERPOLATIONS[interpolation]
+        self.pool = ThreadPoolExecutor(os.cpu_count())
+
+        self.frame_filenames = read_output_frame_filenames()
+        self.ranges = read_output_index(self.frame_filenames)
+        self.indexed = self.ranges is not None
+        if not self.indexed:
+            self.ranges = []
+
+        self.cache = OrderedDict()
+        self.cache_size = 0
+        self.frame_size = None
+        self.current = 0
+        self.condition = threading.Condition()
+
+        if not self.indexed:
+            threading.Thread(target=self.index, daemon=True).start()
+        threading.Thread(target=self.load, daemon=True).start()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.ranges)
+
+    def get(self, video_nr):
+        with self.condition:
+            frames = self.cache.get(video_nr)
+            if frames is not None:
+                self.cache.move_to_end(video_nr)
+            return frames
+
+    def wait(self, video_nr):
+        with self.condition:
+            while video_nr not in self.cache:
+                self.condition.wait()
+            self.cache.move_to_end(video_nr)
+            return self.cache[video_nr]
+
+    def wait_indexed(self):
+        with self.condition:
+            while not self.indexed:
+                self.condition.wait()
+
+    def last_frame(self, video_nr):
+        # Only used for thumbnails, so a frame that is not cached is decoded at reduced size.
+        with self.condition:
+            frames = self.cache.get(video_nr)
+            start, stop = self.ranges[video_nr]
+
+        if frames:
+            return frames[-1]
+        if start == stop:
+            return None
+        return cv2.imread(self.frame_filenames[stop - 1], cv2.IMREAD_REDUCED_COLOR_4)
+
+    def set_current(self, video_nr):
+        with self.condition:
+            self.current = video_nr
+            self.condition.notify_all()
+
+    def window(self):
+        window = [self.current]
+        for offset in range(1, max(self.ahead, self.behind) + 1):
+            if offset <= self.ahead:
+                window.append(self.current + offset)
+            if offset <= self.behind:
+                window.append(self.current - offset)
+        return [video_nr for video_nr in window if 0 <= video_nr < len(self.ranges)]
+
+    def reserve(self, video_nr, window):
+        # Evicts least recently used videos outside of the window until `video_nr` fits.
+        if self.frame_size is None:
+            return True
+
+        start, stop = self.ranges[video_nr]
+        needed = (stop - start) * self.frame_size
+        for evicted_nr in [*self.cache]:
+            if self.cache_size + needed <= self.memory_budget:
+                break
+            if evicted_nr not in window:
+                self.cache_size -= sum(frame.nbytes for frame in self.cache.pop(evicted_nr))
+
+        return self.cache_size + needed <= self.memory_budget or video_nr == self.current
+
+    def store(self, video_nr, frames):
+        window = self.window()
+        if video_nr in self.cache or video_nr not in window or not self.reserve(video_nr, window):
+            return
+
+        if frames:
+            self.frame_size = frames[0].nbytes
+        self.cache[video_nr] = frames
+        self.cache_size += sum(frame.nbytes for frame in frames)
+        self.condition.notify_all()
+
+    def prepare(self, frame):
+        return prepare_frame(frame, self.display_size, self.interpolation)
+
+    def read_frame(self, filename):
+        return self.prepare(cv2.imread(filename))
+
+    def next_to_load(self):
+        window = self.window()
+        for video_nr in window:
+            if video_nr not in self.cache:
+                return video_nr if self.reserve(video_nr, window) else None
+        return None
+
+    def index(self):
+        ranges = []
+        for start, stop, frames in scan_output_videos(self.frame_filenames):
+            ranges.append((start, stop))
+            if start == stop:
+                continue
+
+            with self.condition:
+                self.ranges = [*ranges]
+                wanted = len(ranges) - 1 in self.window()
+                self.condition.notify_all()
+
+            if wanted:
+                frames = [*self.pool.map(self.prepare, frames)]
+                with self.condition:
+                    self.store(len(ranges) - 1, frames)
+
+        write_output_index(self.frame_filenames, ranges)
+        with self.condition:
+            self.ranges = read_output_index(self.frame_filenames)
+            self.indexed = True
+            self.condition.notify_all()
+
+    def load(self):
+        while True:
+            with self.condition:
+                video_nr = self.next_to_load()
+                while video_nr is None:
+                    self.condition.wait()
+                    video_nr = self.next_to_load()
+                start, stop = self.ranges[video_nr]
+
+            frames = [*self.pool.map(self.read_frame, self.frame_filenames[start:stop])]
+
+            with self.condition:
+                self.store(video_nr, frames)
+
+def deck_pages(manifest, video_count):
+    # Returns (page number, title, last video of the page) for every page of the deck.
+    pages = []
+    for video_nr in range(video_count):
+        if manifest is not None and video_nr < len(manifest):
+            page, title = manifest[video_nr]["page"], manifest[video_nr]["title"]
+        else:
+            page, title = video_nr + 1, None
+
+        if pages and pages[-1][0] == page:
+            pages[-1] = (page, title, video_nr)
+        else:
+            pages.append((page, title, video_nr))
+    return pages
+
+def find_page(pages, query):
+    # Matches a page number, or else the first page whose title contains `query`.
+    for page, title, video_nr in pages:
+        if query.isdigit() and int(query) == page:
+            return video_nr
+    for page, title, video_nr in pages:
+        if not query.isdigit() and title and query.lower() in title.lower():
+            return video_nr
+    return None
+
+def build_overview(deck, pages, display_size):
+    width, height = display_size
+    columns = max(1, int(np.ceil(np.sqrt(len(pages)))))
+    rows = max(1, int(np.ceil(len(pages) / columns)))
+    cell_width, cell_height = width // columns, height // rows
+
+    overview = np.full((height, width, 3), 255, np.uint8)
+    cells = []
+    for idx, (page, title, video_nr) in enumerate(pages):
+        x, y = (idx % columns) * cell_width, (idx // columns) * cell_height
+
+        thumbnail = deck.last_frame(video_nr)
+        if thumbnail is not None:
+            size = fit_frame_size(thumbnail.shape, (cell_width - 8, cell_height - 8))
+            overview[y + 4:y + 4 + size[1], x + 4:x + 4 + size[0]] = cv2.resize(thumbnail, size, interpolation=cv2.INTER_AREA)
+            cv2.rectangle(overview, (x + 4, y + 4), (x + 4 + size[0], y + 4 + size[1]), (191, 191, 191), 1)
+
+        label = str(page) if title is None else f"{page}. {title}"
+        cv2.putText(overview, label, (x + 10, y + 24), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 4, cv2.LINE_AA)
+        cv2.putText(overview, label, (x + 10, y + 24), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (63, 63, 63), 1, cv2.LINE_AA)
+
+        cells.append((x, y, x + cell_width, y + cell_height, video_nr))
+
+    return overview, cells
+
+SHARED_MEMORY_PREFIX = "trivial_connections"
+
+def deck_fingerprint(display_size, interpolation):
+    # Identifies the rendered frames and how they were decoded, so a resident deck from before a re-render,
+    # or decoded for another display size, is not taken for the current one.
+    sha = hashlib.sha1(f"{display_size} {interpolation}".encode())
+    for filename in read_output_frame_filenames():
+        stat = os.stat(filename)
+        sha.update(f"{os.path.basename(filename)} {stat.st_size} {stat.st_mtime_ns}\n".encode())
+    return int.from_bytes(sha.digest()[:8], "little", signed=True)
+
+def attach_shared_memory(name):
+    # Attaching must not hand the segment to this process' resource tracker,
+    # or it would be unlinked as soon as the presenter exits.
+    # Only POSIX registers segments with the tracker; on Windows there is nothing to undo.
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name)
+        if os.name == "posix":
+            resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+class SharedDeck:
+    # Zero-copy view on a deck held in shared memory by a resident loader (see `serve_shared_deck`).
+    # The state segment holds [video count, height, width, current video, fingerprint, frame count per video].
+
+    def __init__(self, state_segment, video_segments):
+        self.state_segment = state_segment
+        self.video_segments = video_segments
+
+        self.state = np.ndarray((len(state_segment.buf) // 8,), np.int64, buffer=state_segment.buf)
+        video_count, height, width = self.state[:3]
+        self.videos = []
+        for segment, frame_count in zip(video_segments, self.state[5:5 + video_count]):
+            frames = np.ndarray((frame_count, height, width, 3), np.uint8, buffer=segment.buf)
+            self.videos.append([*frames])
+        self.indexed = True
+
+    @staticmethod
+    def attach(display_size=None, interpolation="cubic"):
+        try:
+            state_segment = attach_shared_memory(f"{SHARED_MEMORY_PREFIX}_state")
+        except FileNotFoundError:
+            return None
+
+        video_count, fingerprint = np.ndarray((5,), np.int64, buffer=state_segment.buf)[[0, 4]]
+        if fingerprint != deck_fingerprint(display_size, interpolation):
+            print(f"\033[33;1mThe resident deck was loaded from other frames or at another size, not attaching to it\033[0m")
+            state_segment.close()
+            return None
+
+        video_count = int(video_count)
+        video_segments = [attach_shared_memory(f"{SHARED_MEMORY_PREFIX}_video_{idx}") for idx in range(video_count)]
+        return SharedDeck(state_segment, video_segments)
+
+    @property
+    def current(self):
+        return int(self.state[3])
+
+    def __len__(self):
+        return len(self.videos)
+
+    def get(self, video_nr):
+        return self.videos[video_nr]
+
+    def wait(self, video_nr):
+        return self.videos[video_nr]
+
+    def wait_indexed(self):
+        pass
+
+    def last_frame(self, video_nr):
+        frames = self.videos[video_nr]
+        return frames[-1] if frames else None
+
+    def set_current(self, video_nr):
+        self.state[3] = video_nr
+
+def serve_shared_deck(display_size=None, interpolation="cubic"):
+    # Decodes the whole deck into shared memory and keeps it there until interrupted,
+    # so a relaunched presenter can attach to it instead of decoding everything again.
+    fingerprint = deck_fingerprint(display_size, interpolation)
+    interpolation = INTERPOLATIONS[interpolation]
+    pool = ThreadPoolExecutor(os.cpu_count())
+    read_frame = lambda filename: prepare_frame(cv2.imread(filename), display_size, interpolation)
+
+    video_filenames = read_output_video_filenames()
+    height, width, _ = read_frame(video_filenames[0][0]).shape
+
+    segments = []
+    try:
+        for idx, filenames in enumerate(video_filenames):
+            segment = shared_memory.SharedMemory(f"{SHARED_MEMORY_PREFIX}_video_{idx}", create=True, size=max(1, len(filenames) * height * width * 3))
+            segments.append(segment)
+
+            frames = np.ndarray((len(filenames), height, width, 3), np.uint8, buffer=segment.buf)
+            for frame_nr, frame in enumerate(pool.map(read_frame, filenames)):
+                frames[frame_nr] = frame
+            print(f"\033[30;1mLoaded video #{idx + 1} ({len(filenames)} frame{'s' * (len(filenames) != 1)})\033[0m")
+
+        state_segment = shared_memory.SharedMemory(f"{SHARED_MEMORY_PREFIX}_state", create=True, size=8 * (5 + len(video_filenames)))
+        segments.append(state_segment)
+        state = np.ndarray((5 + len(video_filenames),), np.int64, buffer=state_segment.buf)
+        state[:5] = [len(video_filenames), height, width, 0, fingerprint]
+        state[5:] = [len(filenames) for filenames in video_filenames]
+
+        print(f"\033[32;1mResident! Press Ctrl+C to release the deck.\033[0m")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
@@ -0,0 +1,139 @@
+import cv2
+import hashlib
+import numpy as np
+import os
+import shutil
+import struct
+import subprocess
+import time
+
+from utils import *
+
+CLIP_CACHE_DIRECTORY = f"{DIRECTORY}/media/clips"
+STATIC_PIXEL_THRESHOLD = 24
+STATIC_PIXEL_COUNT = 16
+
+FFMPEG_CODECS = {"h264": "libx264", "hevc": "libx265"}
+OPENCV_CODECS = {"mp4v": "mp4v"}
+
+def ffmpeg_encoders():
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return set()
+
+    output = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    return {line.split()[1] for line in output.splitlines() if len(line.split()) > 1}
+
+def encoder_settings(codecs, preset="medium", quality=23, bitrate=None):
+    # Picks the first codec of the fallback chain that can be used here. Preset, quality
+    # (CRF) and bitrate only apply to ffmpeg codecs; a bitrate overrides the quality.
+    available = ffmpeg_encoders()
+    for codec in codecs:
+        if codec in FFMPEG_CODECS and FFMPEG_CODECS[codec] in available:
+            return codec, preset, quality, bitrate
+        if codec in OPENCV_CODECS:
+            return codec, None, None, None
+    raise ValueError(f"None of the codecs {codecs} is available")
+
+def video_key(frame_filenames, settings):
+    # Hashes the encoded frame files, so unchanged slides are recognised without decoding them.
+    sha = hashlib.sha1()
+    for idx, frame_filename in enumerate(frame_filenames):
+        with open(frame_filename, "rb") as f:
+            data = f.read()
+        if idx == 0:
+            width, height = struct.unpack(">II", data[16:24])
+            sha.update(f"{settings} {FRAMERATE} {width}x{height}".encode())
+        sha.update(data)
+    return sha.hexdigest()
+
+def is_static_video(frame_filenames):
+    # A slide is static when in no frame more than STATIC_PIXEL_COUNT pixels (of the greyscale frame at half size)
+    # differ from the last one by more than STATIC_PIXEL_THRESHOLD levels out of 255. Counting pixels instead of
+    # averaging keeps small moving things, like a single arrow, from passing as still.
+    # Byte-identical frame files are recognised without decoding anything.
+    digests = set()
+    for frame_filename in frame_filenames:
+        with open(frame_filename, "rb") as f:
+            digests.add(hashlib.sha1(f.read()).digest())
+    if len(digests) == 1:
+        return True
+
+    read_frame = lambda filename: cv2.imread(filename, cv2.IMREAD_REDUCED_GRAYSCALE_2).astype(np.int16)
+
+    last_frame = read_frame(frame_filenames[-1])
+    changed_pixels = lambda filename: (np.abs(read_frame(filename) - last_frame) > STATIC_PIXEL_THRESHOLD).sum()
+    return all(changed_pixels(filename) <= STATIC_PIXEL_COUNT for filename in frame_filenames[:-1])
+
+def write_video_ffmpeg(video_filename, frame_filenames, settings):
+    # ffmpeg reads the frame files itself through a concat list, so no pixel data passes through Python.
+    codec, preset, quality, bitrate = settings
+
+    concat_filename = f"{video_filename}.ffconcat"
+    with open(concat_filename, "w") as f:
+        f.write("ffconcat version 1.0\n")
+        for frame_filename in frame_filenames:
+            f.write(f"file '{frame_filename}'\nduration {1 / FRAMERATE}\n")
+        f.write(f"file '{frame_filenames[-1]}'\n")
+
+    rate_control = ["-b:v", str(bitrate)] if bitrate is not None else ["-crf", str(quality)]
+    # Clips are encoded by a process per core already, so every encoder gets a single thread.
+    thread_options = ["-threads", "1", *(["-x265-params", "pools=1:frame-threads=1"] if codec == "hevc" else [])]
+    result = subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", concat_filename,
+        "-frames:v", str(len(frame_filenames)), "-r", str(FRAMERATE),
+        "-c:v", FFMPEG_CODECS[codec], "-preset", preset, *rate_control, *thread_options, "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart", "-f", "mov", video_filename,
+    ])
+    os.unlink(concat_filename)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {video_filename}")
+
+def write_video_opencv(video_filename, frame_filenames, settings):
+    # Fallback without ffmpeg: frames are decoded one at a time and handed to cv2.VideoWriter.
+    codec, _, _, _ = settings
+
+    video_writer = None
+    for frame_filename in frame_filenames:
+        frame = cv2.imread(frame_filename)
+        if video_writer is None:
+            height, width, _ = frame.shape
+            video_writer = cv2.VideoWriter(video_filename, cv2.VideoWriter_fourcc(*OPENCV_CODECS[codec]), FRAMERATE, (width, height))
+        video_writer.write(frame)
+    video_writer.release()
+
+def encode_video(task):
+    # Encodes one slide into its own clip and poster frame, reusing them from the cache
+    # when the same frames were encoded with the same settings before.
+    # Static slides only get a still image; the returned video filename is then None.
+    key, frame_filenames, settings = task
+    video_filename = f"{CLIP_CACHE_DIRECTORY}/{key}.mov"
+    thumbnail_filename = f"{CLIP_CACHE_DIRECTORY}/{key}.png"
+    still_filename = f"{CLIP_CACHE_DIRECTORY}/{key}.still.png"
+    if os.path.exists(still_filename):
+        return None, still_filename, True, 0
+    if os.path.exists(video_filename) and os.path.exists(thumbnail_filename):
+        return video_filename, thumbnail_filename, True, 0
+
+    start_time = time.time()
+    os.makedirs(CLIP_CACHE_DIRECTORY, exist_ok=True)
+    if is_static_video(frame_filenames):
+        partial_still_filename = f"{CLIP_CACHE_DIRECTORY}/{key}.partial.png"
+        shutil.copyfile(frame_filenames[-1], partial_still_filename)
+        os.replace(partial_still_filename, still_filename)
+        return None, still_filename, False, time.time() - start_time
+
+    partial_video_filename = f"{CLIP_CACHE_DIRECTORY}/{key}.partial.mov"
+    partial_thumbnail_filename = f"{CLIP_CACHE_DIRECTORY}/{key}.partial.png"
+
+    shutil.copyfile(frame_filenames[0], partial_thumbnail_filename)
+    if settings[0] in FFMPEG_CODECS:
+        write_video_ffmpeg(partial_video_filename, frame_filenames, settings)
+    else:
+        write_video_opencv(partial_video_filename, frame_filenames, settings)
+
+    os.replace(partial_video_filename, video_filename)
+    os.replace(partial_thumbnail_filename, thumbnail_filename)
+    return video_filename, thumbnail_filename, False, time.time() - start_time
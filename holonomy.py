@@ -0,0 +1,22 @@
+import numpy as np
+import scipy.sparse
+
+from cycles import *
+
+def cycle_holonomies(mesh, matrix):
+    # Levi-Civita holonomy in (-pi, pi] of every dual cycle in the rows of `matrix`: the transport angles
+    # are gathered per dual edge and summed per cycle in a single sparse product.
+    return np.angle(np.exp(1j * (matrix @ mesh.transport_angles())))
+
+def basis_cycles(mesh, generators=[]):
+    # The matrix of all basis cycles and the defect of each, in one pass: vertex cycles first (one fewer on
+    # closed meshes, where they are dependent), then `generators`. Vertex cycles get their exact angle defect,
+    # which can exceed pi at sharp cone points, generators their holonomy.
+    vertex_matrix = vertex_cycle_matrix(mesh)
+    vertex_defects = mesh.angle_defects()[mesh.interior_vertices]
+    if not mesh.boundary_vertices.any():
+        vertex_matrix, vertex_defects = vertex_matrix[:-1], vertex_defects[:-1]
+
+    generator_matrix = cycle_matrix(mesh, generators)
+    matrix = scipy.sparse.vstack([vertex_matrix, generator_matrix]).tocsr()
+    return matrix, np.concatenate([vertex_defects, cycle_holonomies(mesh, generator_matrix)])
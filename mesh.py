@@ -0,0 +1,127 @@
+import numpy as np
+
+class TriangleMesh:
+    # Connectivity and geometry of an oriented triangle mesh, kept as flat index arrays.
+    # Edges are stored once as (low vertex, high vertex). The dual edge of an edge runs from the face
+    # holding the half-edge low -> high (edge_faces[:, 0]) to the face holding high -> low (edge_faces[:, 1]);
+    # boundary edges have -1 on the missing side.
+
+    def __init__(self, vertices, faces, edges=None, face_edges=None, edge_faces=None):
+        # The connectivity arrays can be passed in when they were cached (see `mesh_loader.load_mesh`).
+        self.vertices = np.asarray(vertices, np.float64)
+        self.faces = np.asarray(faces, np.int64)
+
+        if edges is None:
+            halfedge_starts = self.faces.reshape(-1)
+            halfedge_ends = self.faces[:, [1, 2, 0]].reshape(-1)
+            low, high = np.minimum(halfedge_starts, halfedge_ends), np.maximum(halfedge_starts, halfedge_ends)
+            edge_ids, halfedge_edges = np.unique(low * len(self.vertices) + high, return_inverse=True)
+            edges = np.stack([edge_ids // len(self.vertices), edge_ids % len(self.vertices)], axis=1)
+            face_edges = halfedge_edges.reshape(-1, 3)
+
+            edge_faces = np.full((len(edges), 2), -1, np.int64)
+            halfedge_faces = np.repeat(np.arange(len(self.faces)), 3)
+            edge_faces[halfedge_edges.reshape(-1), (halfedge_starts > halfedge_ends).astype(np.int64)] = halfedge_faces
+
+        self.edges = np.asarray(edges, np.int64)
+        self.face_edges = np.asarray(face_edges, np.int64)
+        self.edge_faces = np.asarray(edge_faces, np.int64)
+
+        self.interior_edges = np.flatnonzero((self.edge_faces >= 0).all(axis=1))
+        boundary_edges = self.edges[(self.edge_faces < 0).any(axis=1)]
+        self.boundary_vertices = np.zeros(len(self.vertices), bool)
+        self.boundary_vertices[boundary_edges.reshape(-1)] = True
+        self.interior_vertices = np.flatnonzero(~self.boundary_vertices)
+
+    @property
+    def euler_characteristic(self):
+        return len(self.vertices) - len(self.edges) + len(self.faces)
+
+    @property
+    def genus(self):
+        # Closed meshes only, one connected component.
+        return (2 - self.euler_characteristic) // 2
+
+    def face_frames(self):
+        # Orthonormal tangent frame per face: the first edge direction, its in-plane perpendicular and the normal.
+        corners = self.vertices[self.faces]
+        first = corners[:, 1] - corners[:, 0]
+        normals = np.cross(first, corners[:, 2] - corners[:, 0])
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        first /= np.linalg.norm(first, axis=1, keepdims=True)
+        return first, np.cross(normals, first), normals
+
+    def corner_angles(self):
+        # Interior angle of every face corner, shaped like `faces`.
+        corners = self.vertices[self.faces]
+        to_next = corners[:, [1, 2, 0]] - corners
+        to_previous = corners[:, [2, 0, 1]] - corners
+        cosines = (to_next * to_previous).sum(axis=2)
+        sines = np.linalg.norm(np.cross(to_next, to_previous), axis=2)
+        return np.arctan2(sines, cosines)
+
+    def angle_defects(self):
+        # Discrete Gaussian curvature 2 pi - (sum of corner angles) at every interior vertex, 0 on the boundary.
+        angle_sums = np.bincount(self.faces.reshape(-1), self.corner_angles().reshape(-1), len(self.vertices))
+        return np.where(self.boundary_vertices, 0, 2 * np.pi - angle_sums)
+
+    def transport_angles(self):
+        # Levi-Civita rotation rho_e = theta_j(e) - theta_i(e) across every dual edge i -> j, where theta_f(e)
+        # is the angle of the edge vector in the frame of face f. Boundary edges get 0.
+        first, second, _ = self.face_frames()
+        edge_vectors = self.vertices[self.edges[:, 1]] - self.vertices[self.edges[:, 0]]
+
+        rho = np.zeros(len(self.edges))
+        i, j = self.edge_faces[self.interior_edges].T
+        vectors = edge_vectors[self.interior_edges]
+        theta_i = np.arctan2((vectors * second[i]).sum(axis=1), (vectors * first[i]).sum(axis=1))
+        theta_j = np.arctan2((vectors * second[j]).sum(axis=1), (vectors * first[j]).sum(axis=1))
+        rho[self.interior_edges] = np.angle(np.exp(1j * (theta_j - theta_i)))
+        return rho
+
+    def find_edges(self, a, b):
+        # Index of the edge between vertices a[i] and b[i], for arrays of vertex pairs.
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        return find_pairs(low, high, self.edges[:, 0], self.edges[:, 1], len(self.vertices))
+
+    def face_adjacency(self):
+        # Returns (from face, to face, edge) for both directions of every dual edge.
+        i, j = self.edge_faces[self.interior_edges].T
+        return np.concatenate([i, j]), np.concatenate([j, i]), np.concatenate([self.interior_edges, self.interior_edges])
+
+def find_pairs(a, b, pair_a, pair_b, count):
+    # Position of every directed pair (a[i], b[i]) among the pairs (pair_a, pair_b), with indices below `count`.
+    # Pairs that are missing map to an arbitrary position, so callers check the result when that can happen.
+    keys = np.asarray(pair_a, np.int64) * count + pair_b
+    order = np.argsort(keys, kind="stable")
+    positions = np.searchsorted(keys, np.asarray(a, np.int64) * count + b, sorter=order)
+    return order[np.minimum(positions, len(keys) - 1)]
+
+def grid_mesh(grid, spacing=1):
+    # Same layout as MainScene.generate_triangle_mesh: `grid[iy]` lists the columns present in row iy.
+    # Returns the mesh and the (ix, iy) key of every vertex.
+    keys = [(ix, iy) for iy in range(len(grid)) for ix in grid[iy]]
+    indices = {key: idx for idx, key in enumerate(keys)}
+    vertices = [np.array([ix - 0.5 * iy, -iy * np.sqrt(3) / 2, 0]) * spacing for ix, iy in keys]
+
+    faces = []
+    for ix, iy in keys:
+        # Both triangles right of (ix, iy), listed counter-clockwise in scene coordinates.
+        for a, b, c in [((ix, iy), (ix + 1, iy + 1), (ix + 1, iy)), ((ix, iy), (ix + 1, iy), (ix, iy - 1))]:
+            if a in indices and b in indices and c in indices:
+                faces.append([indices[a], indices[b], indices[c]])
+
+    return TriangleMesh(vertices, faces), keys
+
+def torus_mesh(rows, columns, radius=2, tube_radius=0.8):
+    # Closed genus 1 mesh: `rows` steps around the main circle, `columns` around the tube, normals facing outwards.
+    u = 2 * np.pi * np.arange(rows)[:, None] / rows
+    v = 2 * np.pi * np.arange(columns)[None, :] / columns
+    ring = radius + tube_radius * np.cos(v)
+    vertices = np.stack([ring * np.cos(u), ring * np.sin(u), tube_radius * np.sin(v) + 0 * u], axis=2).reshape(-1, 3)
+
+    i, j = np.meshgrid(np.arange(rows), np.arange(columns), indexing="ij")
+    a, b = i * columns + j, i * columns + (j + 1) % columns
+    c, d = (i + 1) % rows * columns + (j + 1) % columns, (i + 1) % rows * columns + j
+    faces = np.concatenate([np.stack([a, d, c], axis=2), np.stack([a, c, b], axis=2)], axis=1).reshape(-1, 3)
+    return TriangleMesh(vertices, faces)
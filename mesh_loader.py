@@ -0,0 +1,106 @@
+import numpy as np
+import os
+
+from mesh import *
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+
+def triangulate(polygons):
+    # Fans every polygon (a list of vertex indices) into triangles.
+    return [[polygon[0], polygon[j], polygon[j + 1]] for polygon in polygons for j in range(1, len(polygon) - 1)]
+
+def read_obj(filename):
+    vertices, polygons = [], []
+    with open(filename) as f:
+        for line in f:
+            if line.startswith("v "):
+                vertices.append(line.split()[1:4])
+            elif line.startswith("f "):
+                # Corners look like "v", "v/vt", "v//vn" or "v/vt/vn", 1-based or negative (relative to the end).
+                indices = [int(corner.split("/")[0]) for corner in line.split()[1:]]
+                polygons.append([idx - 1 if idx > 0 else len(vertices) + idx for idx in indices])
+
+    return np.array(vertices, np.float64).reshape(-1, 3), np.array(triangulate(polygons), np.int64).reshape(-1, 3)
+
+def read_ply_header(f):
+    # Returns the byte order, the elements as (name, count, [(property, type, list count type or None)])
+    # and the offset of the binary body.
+    if f.readline().strip() != b"ply":
+        raise ValueError(f"{f.name} is not a PLY file")
+
+    byte_order, elements = None, []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError(f"{f.name} ends before end_header")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            return byte_order, elements, f.tell()
+        if words[0] == "format":
+            if words[1] not in ("binary_little_endian", "binary_big_endian"):
+                raise ValueError(f"Only binary PLY files are supported, {f.name} is {words[1]}")
+            byte_order = "<" if words[1] == "binary_little_endian" else ">"
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property" and words[1] == "list":
+            elements[-1][2].append((words[4], PLY_TYPES[words[3]], PLY_TYPES[words[2]]))
+        elif words[0] == "property":
+            elements[-1][2].append((words[2], PLY_TYPES[words[1]], None))
+
+def read_ply(filename):
+    # Binary PLY. Fixed-size records (all vertices, and faces when every face is a triangle) are
+    # memory-mapped instead of read, so only the coordinates and indices that are used get paged in.
+    with open(filename, "rb") as f:
+        byte_order, elements, offset = read_ply_header(f)
+
+    vertices, faces = None, None
+    for name, count, properties in elements:
+        if all(list_type is None for _, _, list_type in properties):
+            dtype = np.dtype([(prop, byte_order + type) for prop, type, _ in properties])
+        elif name == "face" and len(properties) == 1:
+            prop, type, list_type = properties[0]
+            dtype = np.dtype([("count", byte_order + list_type), (prop, byte_order + type, 3)])
+        else:
+            raise ValueError(f"Unsupported PLY element \"{name}\" in {filename}")
+
+        records = np.memmap(filename, dtype, "r", offset, (count,))
+        if name == "vertex":
+            vertices = np.stack([records["x"], records["y"], records["z"]], axis=1).astype(np.float64)
+        elif name == "face":
+            if (records["count"] != 3).any():
+                raise ValueError(f"Only triangle meshes are supported, {filename} has polygons")
+            faces = records[dtype.names[1]].astype(np.int64)
+        offset += count * dtype.itemsize
+
+    return vertices, faces
+
+CACHED_ARRAYS = ["vertices", "faces", "edges", "face_edges", "edge_faces"]
+
+def load_mesh(filename):
+    # Loads an OBJ or binary PLY mesh. The parsed arrays and the connectivity are cached as .npy files next to it
+    # and memory-mapped on later loads, so reloading a large model neither parses, sorts nor copies anything.
+    cache_filenames = [f"{filename}.{name}.npy" for name in CACHED_ARRAYS]
+    if all(os.path.exists(cache_filename) and os.path.getmtime(cache_filename) >= os.path.getmtime(filename) for cache_filename in cache_filenames):
+        return TriangleMesh(*[np.load(cache_filename, mmap_mode="r") for cache_filename in cache_filenames])
+
+    if filename.lower().endswith(".obj"):
+        vertices, faces = read_obj(filename)
+    elif filename.lower().endswith(".ply"):
+        vertices, faces = read_ply(filename)
+    else:
+        raise ValueError(f"Unknown mesh format: {filename}")
+
+    mesh = TriangleMesh(vertices, faces)
+    for cache_filename, name in zip(cache_filenames, CACHED_ARRAYS):
+        with open(f"{cache_filename}.partial", "wb") as f:
+            np.save(f, getattr(mesh, name))
+        os.replace(f"{cache_filename}.partial", cache_filename)
+
+    return mesh
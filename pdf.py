@@ -0,0 +1,70 @@
+import cv2
+import hashlib
+import zlib
+
+def compress_page(task):
+    # Reads a single frame and compresses it into an image stream for `PdfWriter.add_page`.
+    # `quality` is the JPEG quality (0-100) for "jpeg", the zlib level (0-9) for "flate".
+    frame_filename, image_format, quality = task
+    frame = cv2.imread(frame_filename)
+    height, width, _ = frame.shape
+
+    if image_format == "jpeg":
+        _, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return width, height, "DCTDecode", data.tobytes()
+    if image_format == "flate":
+        if not 0 <= quality <= 9:
+            raise ValueError(f"Flate compression level must be between 0 and 9, not {quality}")
+        return width, height, "FlateDecode", zlib.compress(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).tobytes(), quality)
+    raise ValueError(f"Unknown PDF image format \"{image_format}\"")
+
+class PdfWriter:
+    # Writes a PDF with one full-page image per page. Pages are appended as they come in,
+    # so only the page being written is held in memory. Identical images are stored once.
+
+    def __init__(self, filename, resolution=100.0):
+        self.file = open(filename, "wb")
+        self.resolution = resolution
+        self.offsets = {}
+        self.page_ids = []
+        self.image_ids = {}
+        self.next_id = 3
+
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def write_object(self, object_id, data, stream=None):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode() + data)
+        if stream is not None:
+            self.file.write(b"\nstream\n" + stream + b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def add_page(self, width, height, image_filter, data):
+        key = hashlib.sha1(data).hexdigest()
+        image_id = self.image_ids.get(key)
+        if image_id is None:
+            image_id = self.image_ids[key] = self.next_id
+            self.next_id += 1
+            self.write_object(image_id, f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /{image_filter} /Length {len(data)} >>".encode(), data)
+
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+
+        page_width, page_height = width * 72 / self.resolution, height * 72 / self.resolution
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode()
+
+        self.write_object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+        self.write_object(page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.2f} {page_height:.2f}] /Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>".encode())
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+
+        xref_offset = self.file.tell()
+        self.file.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self.next_id):
+            self.file.write(f"{self.offsets[object_id]:010} 00000 n \n".encode())
+        self.file.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        self.file.close()
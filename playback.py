@@ -0,0 +1,154 @@
+import cv2
+import numpy as np
+import time
+
+ACTION_KEYS = {0: 32, 1: 100, 2: 97, 3: 27}
+
+class FrameScheduler:
+    # Paces playback of a single video: picks the frame for the current time, tells the
+    # main loop how long it may sleep, and keeps track of frames shown late or skipped.
+
+    def __init__(self, framerate, idle_interval):
+        self.framerate = framerate
+        self.idle_interval = idle_interval
+
+        self.start_time = 0
+        self.frame_count = 1
+        self.last_frame_nr = None
+
+        self.shown_frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.total_late_frames = 0
+        self.total_dropped_frames = 0
+
+    def start(self, start_time):
+        # A start time of 0 jumps straight to the last frame of the video.
+        self.start_time = start_time
+        self.last_frame_nr = None
+        self.shown_frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+
+    def select(self, frame_count, now):
+        self.frame_count = frame_count
+
+        elapsed_frame_nr = int((now - self.start_time) * self.framerate)
+        frame_nr = max(0, min(elapsed_frame_nr, frame_count - 1))
+
+        if frame_nr != self.last_frame_nr:
+            if self.start_time:
+                if frame_nr == elapsed_frame_nr and now - self.start_time - frame_nr / self.framerate > 0.5 / self.framerate:
+                    self.late_frames += 1
+                    self.total_late_frames += 1
+                if self.last_frame_nr is not None and frame_nr > self.last_frame_nr + 1:
+                    self.dropped_frames += frame_nr - self.last_frame_nr - 1
+                    self.total_dropped_frames += frame_nr - self.last_frame_nr - 1
+            self.shown_frames += 1
+            self.last_frame_nr = frame_nr
+
+        return frame_nr
+
+    def delay(self, now):
+        if not self.start_time or self.last_frame_nr is None or self.last_frame_nr >= self.frame_count - 1:
+            return self.idle_interval
+
+        deadline = self.start_time + (self.last_frame_nr + 1) / self.framerate
+        return max(0, min(deadline - now, self.idle_interval))
+
+class LatencyProbe:
+    # Measures click-to-photon latency: from an input event, via the selection of the
+    # first frame of the next video, to the moment imshow has handed that frame over.
+
+    BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+
+        self.input_time = None
+        self.select_time = None
+        self.latencies = []
+
+    def input(self):
+        if self.enabled and self.input_time is None:
+            self.input_time = time.perf_counter()
+
+    def cancel(self):
+        self.input_time = None
+        self.select_time = None
+
+    def selected(self):
+        if self.input_time is not None and self.select_time is None:
+            self.select_time = time.perf_counter()
+
+    def shown(self):
+        if self.select_time is None:
+            return
+
+        shown_time = time.perf_counter()
+        self.latencies.append((self.select_time - self.input_time, shown_time - self.input_time))
+        self.cancel()
+
+    def overlay(self, frame):
+        if not self.enabled or not self.latencies:
+            return frame
+
+        totals = 1000 * np.array([total for _, total in self.latencies])
+        text = f"{totals[-1]:.1f} ms  (p50 {np.percentile(totals, 50):.1f}, p95 {np.percentile(totals, 95):.1f}, n={len(totals)})"
+
+        frame = frame.copy()
+        cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 4, cv2.LINE_AA)
+        cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 1, cv2.LINE_AA)
+        return frame
+
+    def write_histogram(self, filename):
+        if not self.enabled or not self.latencies:
+            return
+
+        selects = 1000 * np.array([select for select, _ in self.latencies])
+        totals = 1000 * np.array([total for _, total in self.latencies])
+        counts, _ = np.histogram(totals, self.BUCKETS + [np.inf])
+
+        with open(filename, "w") as f:
+            f.write(f"{len(totals)} transitions\n")
+            f.write(f"input -> frame selected: p50 {np.percentile(selects, 50):.2f} ms, p95 {np.percentile(selects, 95):.2f} ms, max {selects.max():.2f} ms\n")
+            f.write(f"input -> imshow done:    p50 {np.percentile(totals, 50):.2f} ms, p95 {np.percentile(totals, 95):.2f} ms, max {totals.max():.2f} ms\n\n")
+            for low, high, count in zip(self.BUCKETS, self.BUCKETS[1:] + [None], counts):
+                label = f"{low:>4}-{high:<4}" if high is not None else f"{low:>4}+    "
+                f.write(f"{label} ms | {'#' * count} {count}\n")
+
+class OffscreenSink:
+    # Stands in for the presenter window: keeps the last frame in memory and replays a
+    # scripted list of actions, each one as soon as the current video has finished playing.
+
+    def __init__(self, actions):
+        self.actions = [*actions]
+        self.buffer = None
+
+        self.shown_frames = 0
+        self.animation_start = None
+        self.animated_frames = 0
+        self.animated_time = 0
+
+    def show(self, frame):
+        if self.buffer is None or self.buffer.shape != frame.shape:
+            self.buffer = np.empty_like(frame)
+        np.copyto(self.buffer, frame)
+        self.shown_frames += 1
+
+    def wait_key(self, delay, idle):
+        if not idle:
+            time.sleep(delay / 1000)
+            return -1
+
+        now = time.perf_counter()
+        if self.animation_start is not None:
+            start_time, start_frames = self.animation_start
+            self.animated_time += now - start_time
+            self.animated_frames += max(0, self.shown_frames - start_frames - 1)
+            self.animation_start = None
+
+        action = self.actions.pop(0) if self.actions else 3
+        if action == 0:
+            self.animation_start = (now, self.shown_frames)
+        return ACTION_KEYS[action]
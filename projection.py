@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+def view_rotation(yaw, pitch, up_axis=1):
+    # Turns by `yaw` around the vertical axis, then tilts by `pitch` towards the viewer.
+    # Models with z up (up_axis=2) are first stood upright, so that z points up on screen.
+    cos_yaw, sin_yaw, cos_pitch, sin_pitch = np.cos(yaw), np.sin(yaw), np.cos(pitch), np.sin(pitch)
+    up_matrix = np.eye(3) if up_axis == 1 else np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]])
+    yaw_matrix = np.array([[cos_yaw, 0, sin_yaw], [0, 1, 0], [-sin_yaw, 0, cos_yaw]])
+    pitch_matrix = np.array([[1, 0, 0], [0, cos_pitch, -sin_pitch], [0, sin_pitch, cos_pitch]])
+    return pitch_matrix @ yaw_matrix @ up_matrix
+
+def project_mesh(mesh, rotation, size, directions=None, arrow_length=0, light=(0.3, 0.5, 1)):
+    # Orthographic view along -z of the rotated mesh, fitted into a square image of `size` pixels whatever
+    # the rotation. Faces turned away from the viewer are culled, the rest are sorted back to front.
+    # Returns the visible faces, their corners in pixels, a Lambert shade per face in [0, 1] and, given
+    # a direction per face, the start and end of its arrow in pixels.
+    center = mesh.vertices.mean(axis=0)
+    scale = 0.95 * size / (2 * np.linalg.norm(mesh.vertices - center, axis=1).max())
+    to_pixels = lambda points: points[..., :2] * [scale, -scale] + size / 2
+
+    vertices = (mesh.vertices - center) @ rotation.T
+    corners = vertices[mesh.faces]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+    faces = np.flatnonzero(normals[:, 2] > 0)
+    faces = faces[np.argsort(corners[faces, :, 2].mean(axis=1), kind="stable")]
+
+    light = np.array(light) / np.linalg.norm(light)
+    normals = normals[faces] / np.linalg.norm(normals[faces], axis=1, keepdims=True)
+    shades = np.clip(normals @ light, 0, 1)
+
+    arrows = None
+    if directions is not None:
+        starts = corners[faces].mean(axis=1)
+        ends = starts + arrow_length * directions[faces] @ rotation.T
+        arrows = np.stack([to_pixels(starts), to_pixels(ends)], axis=1)
+
+    return faces, to_pixels(corners[faces]), shades, arrows
+
+def rasterize_mesh(mesh, rotation, size, directions=None, color=(191, 191, 191), vector_color=(195, 49, 47)):
+    # Paints the visible faces back to front into an RGBA image of `size` pixels, with every face's tangent
+    # vector right after it, so that nearer faces cover farther ones. Drawn at twice the size and reduced,
+    # which antialiases the face edges without leaving seams between neighbouring faces.
+    # A raster rather than one VMobject: all subpaths of a VMobject share one fill and are filled before any is
+    # stroked, so it can neither shade per face nor keep the depth order where a surface covers itself, and a
+    # mobject per face is what is too slow. Wrap the result in an ImageMobject and replace its `pixel_array`
+    # from an updater to turn the mesh.
+    arrow_length = 0.6 * np.linalg.norm(mesh.vertices[mesh.edges[:, 1]] - mesh.vertices[mesh.edges[:, 0]], axis=1).mean()
+    faces, polygons, shades, arrows = project_mesh(mesh, rotation, 2 * size, directions, arrow_length)
+
+    face_colors = (0.4 + 0.6 * shades[:, None]) * color
+    image = np.zeros((2 * size, 2 * size, 4), np.uint8)
+    for idx in range(len(faces)):
+        cv2.fillConvexPoly(image, np.round(16 * polygons[idx]).astype(np.int32), (*face_colors[idx], 255), cv2.LINE_8, 4)
+        if arrows is not None:
+            start, end = np.round(arrows[idx]).astype(np.int32)
+            cv2.arrowedLine(image, (*start,), (*end,), (*vector_color, 255), 3, cv2.LINE_AA, 0, 0.3)
+
+    return cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
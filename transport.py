@@ -0,0 +1,37 @@
+import numpy as np
+
+from mesh import *
+
+class ParallelTransport:
+    # Moves tangent vectors along many face paths at once through a fixed connection: the Levi-Civita
+    # rotation rho plus the adjustment angles x. Every directed dual edge gets its rotation up front,
+    # so a batch of paths costs one sorted lookup and one cumulative sum, whatever the number of paths.
+
+    def __init__(self, mesh, x):
+        self.mesh = mesh
+        self.frames = mesh.face_frames()
+
+        self.faces_from, self.faces_to, edges = mesh.face_adjacency()
+        signs = np.where(mesh.edge_faces[edges, 0] == self.faces_from, 1, -1)
+        self.rotations = signs * (mesh.transport_angles() + x)[edges]
+
+    def transport(self, paths, start_angles=0):
+        # `paths` holds one row of faces per vector, consecutive faces equal (waiting) or adjacent.
+        # Returns the angle of every vector at every step, in the frame of the face it is on.
+        paths = np.asarray(paths)
+        moving = paths[:, 1:] != paths[:, :-1]
+        faces_from, faces_to = paths[:, :-1][moving], paths[:, 1:][moving]
+
+        idx = find_pairs(faces_from, faces_to, self.faces_from, self.faces_to, len(self.mesh.faces))
+        if len(idx) and ((self.faces_from[idx] != faces_from) | (self.faces_to[idx] != faces_to)).any():
+            raise ValueError("Paths may only step between adjacent faces")
+
+        steps = np.zeros(moving.shape)
+        steps[moving] = self.rotations[idx]
+        start_angles = np.broadcast_to(start_angles, (len(paths),))
+        return np.concatenate([start_angles[:, None], start_angles[:, None] + np.cumsum(steps, axis=1)], axis=1)
+
+    def directions(self, paths, angles):
+        # World space unit vectors for angles returned by `transport`.
+        first, second, _ = self.frames
+        return np.cos(angles)[..., None] * first[paths] + np.sin(angles)[..., None] * second[paths]
@@ -1,4 +1,5 @@
 import cv2
+import json
 import os
 import numpy as np
 
@@ -7,6 +8,9 @@ FRAMERATE = 60
 DIRECTORY = os.path.realpath(os.path.dirname(__file__))
 RENDER_DIRECTORY = f"{DIRECTORY}/media/images/1_render"
 OUTPUT_DIRECTORY = f"{DIRECTORY}/output"
+OUTPUT_INDEX_FILENAME = f"{OUTPUT_DIRECTORY}/index.json"
+RENDER_MANIFEST_FILENAME = f"{DIRECTORY}/media/manifest.json"
+OUTPUT_MANIFEST_FILENAME = f"{OUTPUT_DIRECTORY}/manifest.json"
 
 PAUSE_MARKER_COLOR = [86, 52, 18]
 PAUSE_MARKER_COLOR_HEX = "#" + "".join(f"{hex(c)[2:]:02}" for c in PAUSE_MARKER_COLOR[::-1])
@@ -25,19 +29,73 @@ BLUE = "#0065A1"
 ICO_BLUE = "#41808E"
 PURPLE = "#6311B7"
 
-def read_output_videos():
-    frame_filenames = sorted(f"{OUTPUT_DIRECTORY}/{filename}" for filename in sorted(os.listdir(OUTPUT_DIRECTORY)))
+def is_pause_marker(frame):
+    return all(list(frame[np.random.randint(0, frame.shape[0]), np.random.randint(0, frame.shape[1])]) == PAUSE_MARKER_COLOR for _ in range(100))
 
-    videos = [[]]
-    for frame_filename in frame_filenames:
+def read_output_frame_filenames():
+    return sorted(f"{OUTPUT_DIRECTORY}/{filename}" for filename in os.listdir(OUTPUT_DIRECTORY) if filename.endswith(".png"))
+
+def scan_output_videos(frame_filenames):
+    # Yields (start, stop, frames) per video, splitting the frame list on pause markers.
+    # Empty videos are yielded as well, so callers can keep the numbering identical.
+    start, frames = 0, []
+    for idx, frame_filename in enumerate(frame_filenames):
         frame = cv2.imread(frame_filename)
-        if all(list(frame[np.random.randint(0, frame.shape[0]), np.random.randint(0, frame.shape[1])]) == PAUSE_MARKER_COLOR for _ in range(100)):
-            print(f"\033[30;1mLoaded video #{len(videos)} ({len(videos[-1])} frame{'s' * (len(videos[-1]) != 1)})\033[0m")
-            videos.append([])
+        if is_pause_marker(frame):
+            yield start, idx, frames
+            start, frames = idx + 1, []
         else:
-            videos[-1].append(frame)
+            frames.append(frame)
+
+    yield start, len(frame_filenames), frames
+
+def scan_output_ranges(frame_filenames):
+    # Yields (start, stop) per video like `scan_output_videos`, but keeps no frames: the pause marker fills the
+    # whole frame, so it is recognised on a 1/8-scale decode.
+    start = 0
+    for idx, frame_filename in enumerate(frame_filenames):
+        if is_pause_marker(cv2.imread(frame_filename, cv2.IMREAD_REDUCED_COLOR_8)):
+            yield start, idx
+            start = idx + 1
+
+    yield start, len(frame_filenames)
+
+def read_output_index(frame_filenames):
+    if not os.path.exists(OUTPUT_INDEX_FILENAME):
+        return None
+
+    with open(OUTPUT_INDEX_FILENAME) as f:
+        index = json.load(f)
+    if index["frame_filenames"] != [os.path.basename(filename) for filename in frame_filenames]:
+        return None
+
+    return [(start, stop) for start, stop in index["videos"]]
+
+def write_output_index(frame_filenames, ranges):
+    while ranges and ranges[-1][0] == ranges[-1][1]:
+        ranges = ranges[:-1]
+
+    with open(OUTPUT_INDEX_FILENAME, "w") as f:
+        json.dump({
+            "frame_filenames": [os.path.basename(filename) for filename in frame_filenames],
+            "videos": [[start, stop] for start, stop in ranges],
+        }, f)
+
+def read_output_manifest():
+    # One entry ({"page": ..., "title": ...}) per video, written by 1_render.py.
+    if not os.path.exists(OUTPUT_MANIFEST_FILENAME):
+        return None
+
+    with open(OUTPUT_MANIFEST_FILENAME) as f:
+        return json.load(f)
+
+def read_output_video_filenames():
+    frame_filenames = read_output_frame_filenames()
 
-    while not videos[-1]:
-        videos.pop()
+    ranges = read_output_index(frame_filenames)
+    if ranges is None:
+        ranges = [*scan_output_ranges(frame_filenames)]
+        write_output_index(frame_filenames, ranges)
+        ranges = read_output_index(frame_filenames)
 
-    return videos
\ No newline at end of file
+    return [frame_filenames[start:stop] for start, stop in ranges]
@@ -0,0 +1,13 @@
+import numpy as np
+
+from cycles import *
+
+def breadth_first_layers(node_count, a, b, root):
+    # All wavefronts of a breadth-first search from `root` over the undirected edges (a[i], b[i]) at once.
+    # Returns the layers (node arrays by distance from the root), the parent of every node and the index i
+    # of the edge to its parent, both -1 at the root.
+    order, parents, parent_edges = spanning_tree(node_count, a, b, root)
+    parents = np.where(parents >= 0, parents, -1)
+    depths = tree_sums(parents, (parents >= 0).astype(np.int64))
+    layers = np.split(order, np.flatnonzero(np.diff(depths[order])) + 1)
+    return layers, parents, parent_edges
@@ -0,0 +1,13 @@
+import numpy as np
+
+from mesh import *
+
+MIN_COTAN_SUM = 1e-3
+
+def cotan_weights(mesh):
+    # Diagonal of D with D_kk = sqrt(2 / (cot phi_i + cot phi_j)), where phi_i and phi_j are the corners opposite
+    # edge k in its two faces (Crane et al. 2010, section 6.1). Edge j of a face runs from corner j to corner j + 1,
+    # so its opposite corner is j + 2. Boundary edges only have one corner; sums of obtuse pairs are clamped.
+    opposite_angles = mesh.corner_angles()[:, [2, 0, 1]]
+    cotan_sums = np.bincount(mesh.face_edges.reshape(-1), 1 / np.tan(opposite_angles.reshape(-1)), len(mesh.edges))
+    return np.sqrt(2 / np.maximum(cotan_sums, MIN_COTAN_SUM))